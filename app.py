@@ -1,23 +1,181 @@
 import streamlit as st
 import pandas as pd
-from io import BytesIO
-import openpyxl
-from openpyxl.styles import Font, PatternFill
-from openpyxl.utils import get_column_letter
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 import unicodedata 
+import hashlib
+import re
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from gradebook import (
+    DEFAULT_SUBJECT_KEYWORDS, compile_subject_filter, subject_filter_counts, score_column, format_percentages, assignment_index,
+    assignment_options, select_assignments, assignment_sections, DUPLICATE_POLICIES, duplicate_key, resolve_duplicates,
+    export_filter_part, export_filenames, export_title, section_title, merge_gradebooks, relabel_upload,
+    occurrence_keys, row_fingerprints,
+)
+from gradebook_cache import read_gradebook_cached
+from selection_store import load_selections, save_selections
+from exports import frame_fingerprint, EXPORT_BUILDERS, SECTION_BUILDERS, to_zip_bundle
+from profiling import debug_mode, start_profile, stage, lap, timed_export, recent_exports
+
+
+UPLOAD_READ_WORKERS = 4
+# Earlier uploads kept for re-upload diffs, one per gradebook title and settings
+MAX_PREVIOUS_UPLOADS = 4
+
+
+# Parsed gradebooks are cached by content hash and subject filter so widget reruns skip openpyxl;
+# the on-disk Parquet cache also covers repeat uploads and server restarts
+@st.cache_data(max_entries=8, ttl=3600, show_spinner=False)
+def load_gradebook(file_hashes, subject_keywords, subject_regex, all_sheets, _files_bytes):
+    subject_filter = compile_subject_filter(subject_keywords, subject_regex)
+
+    def read_upload(file_number, file_bytes, file_hash):
+        with stage(f"file {file_number}"):
+            return read_gradebook_cached(file_bytes, file_hash, subject_filter=subject_filter, all_sheets=all_sheets)
+
+    # Several uploads are parsed side by side with the same settings and concatenated once.
+    # Each parse runs in a copy of this context, so its profiling stages are still recorded.
+    with ThreadPoolExecutor(max_workers=min(len(_files_bytes), UPLOAD_READ_WORKERS)) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, read_upload, file_number, file_bytes, file_hash)
+            for file_number, (file_bytes, file_hash) in enumerate(zip(_files_bytes, file_hashes), start=1)
+        ]
+        parsed = [future.result() for future in futures]
+    return merge_gradebooks(parsed)
+
+
+@st.cache_data(max_entries=8, ttl=3600, show_spinner=False)
+def load_subject_counts(file_hash, subject_keywords, subject_regex, assignments_col, _df):
+    return subject_filter_counts(_df, assignments_col, subject_keywords, subject_regex)
+
+
+# Assignment -> row positions, built once per parsed upload for the multiselect and the selection
+@st.cache_data(max_entries=8, ttl=3600, show_spinner=False)
+def load_assignment_index(file_hash, subject_keywords, subject_regex, assignments_col, _df):
+    return assignment_index(_df, assignments_col)
+
+
+# Exports are built lazily from the download buttons and memoized per frame
+@st.cache_data(max_entries=32, show_spinner=False)
+def build_export(export_format, fingerprint, title, percentage_cols, _df, split_col=None, split_assignments=(),
+                 filenames=None, roles=None):
+    if export_format == "zip":
+        sections = export_sections(_df, title, split_col, split_assignments)
+        output = to_zip_bundle(_df, sections, filenames, list(percentage_cols), roles=roles)
+    elif split_col is None:
+        output = EXPORT_BUILDERS[export_format](_df, title, list(percentage_cols), roles=roles)
+    else:
+        output = SECTION_BUILDERS[export_format](_df, export_sections(_df, title, split_col, split_assignments),
+                                                 list(percentage_cols), roles=roles)
+    return output.getvalue()
+
+
+def export_sections(df, title, split_col=None, split_assignments=()):
+    if split_col is None:
+        return [("FilteredData", title, None)]
+    return [
+        (assignment, section_title(title, assignment), positions)
+        for assignment, positions in assignment_sections(df, split_col, split_assignments)
+    ]
+
+
+# The callable runs on the download request, outside the script run where st.* calls are
+# ignored; a failure is queued in session state and shown on the next rerun
+EXPORT_ERROR_MESSAGE = "Excel/PDF faylı yaradıla bilmədi"
+
+
+def lazy_export(export_format, df, title, fingerprint, percentage_cols, split_col=None, split_assignments=(),
+                filenames=None, roles=None):
+    percentage_cols = tuple(percentage_cols)
+    split_assignments = tuple(split_assignments)
+    export_errors = st.session_state.setdefault("export_errors", [])
+
+    def build():
+        try:
+            return timed_export(export_format, lambda: build_export(
+                export_format, fingerprint, title, percentage_cols, df, split_col, split_assignments, filenames, roles))
+        except Exception as e:
+            export_errors.append(f"{EXPORT_ERROR_MESSAGE}: {e}")
+            raise
+    return build
+
+
+# Duplicate review table: a keep checkbox per row next to its index label
+REVIEW_KEEP_COL = "Saxla"
+REVIEW_ROW_COL = "Sıra"
+
+
+# Result tables are sorted and sliced server-side; only the visible page is formatted and sent
+PAGE_SIZES = [50, 100, 250, 500]
+
+
+def sorted_positions(df, sort_col, descending):
+    values = df[sort_col].reset_index(drop=True)
+    try:
+        ordered = values.sort_values(ascending=not descending, na_position="last", kind="stable")
+    except TypeError:
+        ordered = values.astype(str).where(values.notna()).sort_values(
+            ascending=not descending, na_position="last", kind="stable")
+    return ordered.index.to_numpy()
+
+
+def render_paginated(df, key, percentage_cols, height):
+    total_rows = len(df)
+    sort_col_ui, order_ui, size_ui, page_ui = st.columns([3, 1, 1, 1])
+    sort_col = sort_col_ui.selectbox(
+        "Sırala", [None] + list(df.columns), key=f"{key}_sort",
+        format_func=lambda col: "Fayl sırası" if col is None else str(col)
+    )
+    descending = order_ui.toggle("Azalan", key=f"{key}_desc")
+    page_size = size_ui.selectbox("Səhifədə sətir", PAGE_SIZES, key=f"{key}_size")
+
+    page_count = max(1, -(-total_rows // page_size))
+    page_key = f"{key}_page"
+    if st.session_state.get(page_key, 1) > page_count:
+        st.session_state[page_key] = page_count
+    page = page_ui.number_input("Səhifə", min_value=1, max_value=page_count, step=1, key=page_key)
+
+    start = (page - 1) * page_size
+    end = min(start + page_size, total_rows)
+    if sort_col is None:
+        page_df = df.iloc[start:end]
+    else:
+        page_df = df.iloc[sorted_positions(df, sort_col, descending)[start:end]]
+
+    st.dataframe(format_percentages(page_df, percentage_cols), use_container_width=True, height=height)
+    st.caption(f"{start + 1 if total_rows else 0}–{end} / {total_rows} sətir · səhifə {page} / {page_count}")
+
+
+def render_profile_panel(profile):
+    with st.sidebar.expander("⏱️ Diaqnostika", expanded=True):
+        stage_rows = [
+            {
+                "Mərhələ": "\u2003" * record["depth"] + ("↳ " if record["depth"] else "") + record["stage"],
+                "Saniyə": round(record["seconds"], 4),
+                **({"Pik MB": round(record["peak_mb"], 2)} if "peak_mb" in record else {}),
+            }
+            for record in profile.records
+        ]
+        st.dataframe(stage_rows, hide_index=True, use_container_width=True)
+        st.caption(f"Cəmi: {profile.total_seconds:.3f} s" + (" · tracemalloc aktivdir" if profile.trace_memory else ""))
+        if recent_exports:
+            st.write("Son yükləmələr")
+            st.dataframe(
+                [{"Format": record["format"], "Saniyə": round(record["seconds"], 3),
+                  "KB": round(record["bytes"] / 1024, 1), "Vaxt": record["at"]} for record in recent_exports],
+                hide_index=True, use_container_width=True
+            )
+
+
 # Set page config to wide mode
 st.set_page_config(
     page_title="Excel Qiymətlər",
     layout="wide"
 )
 
+# Opt-in per-stage diagnostics: ?debug=1 for timings, ?debug=memory adds tracemalloc peaks
+profile = start_profile(debug_mode(st.query_params.get("debug")))
+
 # Your desired translations
 translated_drag_and_drop = "Qiymətlər olan Exceli bura yükləyin"
 translated_limit = " "
@@ -86,75 +244,89 @@ st.markdown(
 
 st.title("Excel Qiymətlər")
 
-uploaded_file = st.file_uploader("Exceli yüklə", type=["xlsx"])
-
-if uploaded_file:
-    wb = openpyxl.load_workbook(uploaded_file, data_only=True)
-    ws = wb.active
-    
-    cols_to_copy = [4, 7, 8, 13, 14, 15]
-    
-    title_cell = ws.cell(row=1, column=4).value
-    # st.write("Title from D1:", title_cell)
-    
-    raw_headers = [ws.cell(row=2, column=col).value for col in cols_to_copy]
-    
-    selected_headers = []
-    for i, header in enumerate(raw_headers):
-        if header is None or header == "":
-            col_letter = openpyxl.utils.get_column_letter(cols_to_copy[i])
-            unique_header = f"Column_{col_letter}"
-        else:
-            unique_header = str(header).strip()
-        
-        original_header = unique_header
-        counter = 1
-        while unique_header in selected_headers:
-            unique_header = f"{original_header}_{counter}"
-            counter += 1
-        
-        selected_headers.append(unique_header)
-    
-    assignments_col_index = None
-    assignments_excel_col = None
-    for i, header in enumerate(raw_headers):
-        if header and "assignment" in str(header).lower():
-            assignments_col_index = i
-            assignments_excel_col = cols_to_copy[i]
-            break
-    
-    data = []
-    filtered_rows_count = 0
-    total_rows_count = 0
-    
-    for row in range(3, ws.max_row + 1):
-        total_rows_count += 1
-        row_values = [ws.cell(row=row, column=col).value for col in cols_to_copy]
-        
-        if assignments_col_index is not None:
-            assignments_value = row_values[assignments_col_index]
-            if assignments_value and isinstance(assignments_value, str):
-                if "riyaziyyat" in assignments_value.lower():
-                    data.append(row_values)
-                    filtered_rows_count += 1
-        else:
-            data.append(row_values)
+# Only assignments matching the subject filter are kept while the workbook is read
+with st.expander("Fənn filtri"):
+    if st.toggle("Regex", key="subject_use_regex"):
+        subject_regex = st.text_input("Regex ifadəsi", value="|".join(DEFAULT_SUBJECT_KEYWORDS), key="subject_regex").strip()
+        subject_keywords = ()
+    else:
+        subject_text = st.text_input(
+            "Açar sözlər",
+            value=", ".join(DEFAULT_SUBJECT_KEYWORDS),
+            key="subject_keywords",
+            help="Vergüllə ayırın; boş saxlasanız bütün imtahanlar saxlanılır"
+        )
+        subject_keywords = tuple(keyword.strip() for keyword in subject_text.split(",") if keyword.strip())
+        subject_regex = ""
+
+try:
+    compile_subject_filter(subject_keywords, subject_regex)
+    subject_filter_error = None
+except re.error as e:
+    subject_filter_error = e
+
+uploaded_files = st.file_uploader("Exceli yüklə", type=["xlsx"], accept_multiple_files=True)
+all_sheets = st.checkbox("Bütün vərəqləri oxu", help="Aktiv vərəqdən başqa eyni quruluşlu vərəqlər də birləşdirilir")
+# Export names and the title come from the first workbook
+uploaded_file = uploaded_files[0] if uploaded_files else None
+
+if subject_filter_error is not None:
+    st.error(f"Regex ifadəsi yanlışdır: {subject_filter_error}")
+elif uploaded_file:
+    files_bytes = [uploaded.getvalue() for uploaded in uploaded_files]
+    file_hashes = tuple(hashlib.sha256(file_bytes).hexdigest() for file_bytes in files_bytes)
+    # One key for the combined upload, so the cached helpers below stay per merged frame
+    file_hash = hashlib.sha256(f"{file_hashes}-{all_sheets}".encode("utf-8")).hexdigest()
+    title_cell, selected_headers, df, total_rows_count, filtered_rows_count, percentage_cols, roles = load_gradebook(
+        file_hashes, subject_keywords, subject_regex, all_sheets, files_bytes)
+    files_part = f"Fayllar: {len(uploaded_files)} | " if len(uploaded_files) > 1 else ""
+    st.caption(f"{files_part}Oxunan sətirlər: {total_rows_count} | Saxlanılan sətirlər: {filtered_rows_count}")
+    lap("parse")
     
-    df = pd.DataFrame(data, columns=selected_headers)
+    # A newer export of the same gradebook (same title, same settings) is diffed against the
+    # previous upload of that gradebook so unchanged rows keep their labels. One entry is kept
+    # per title and settings, with its occurrence keys so it is not rehashed on the next upload.
+    upload_settings = (str(title_cell), subject_keywords, subject_regex, all_sheets)
+    previous_uploads = st.session_state.setdefault("previous_uploads", {})
+    previous_upload = previous_uploads.get(upload_settings)
+    if previous_upload is not None and previous_upload["files"] == file_hashes:
+        df, upload_changes = previous_upload["df"], previous_upload["changes"]
+    else:
+        upload_changes = None
+        upload_keys = occurrence_keys(row_fingerprints(df))
+        if previous_upload is not None:
+            identity_cols = [roles[role] for role in ("email", "assignment") if role in roles]
+            df, upload_changes = relabel_upload(previous_upload["df"], df, identity_cols,
+                                                previous_keys=previous_upload["keys"], keys=upload_keys)
+        previous_uploads.pop(upload_settings, None)
+        previous_uploads[upload_settings] = {
+            "files": file_hashes,
+            "keys": upload_keys,
+            "df": df,
+            "changes": upload_changes,
+        }
+        # Oldest gradebooks are dropped first so the session holds a bounded number of frames
+        while len(previous_uploads) > MAX_PREVIOUS_UPLOADS:
+            previous_uploads.pop(next(iter(previous_uploads)))
+    if upload_changes is not None:
+        st.caption(
+            f"Əvvəlki yükləmə ilə müqayisə: +{upload_changes['added']} yeni · "
+            f"{upload_changes['changed']} dəyişən · −{upload_changes['removed']} silinən"
+        )
+    lap("upload diff")
     
-    assignments_col = None
-    for col_name in selected_headers:
-        if col_name and "assignment" in col_name.lower():
-            assignments_col = col_name
-            break
+    assignments_col = roles.get("assignment")
+    subject_counts = load_subject_counts(file_hash, subject_keywords, subject_regex, assignments_col, df)
+    if subject_counts:
+        st.caption("Filtr üzrə: " + " · ".join(f"{keyword}: {count}" for keyword, count in subject_counts.items()))
+    lap("subject counts")
     
     if assignments_col is None:
         st.error("'Assignments' sütunu tapılmadı")
         st.write("sütunlar:", selected_headers)
     else:
-        assignments_series = df[assignments_col].dropna()
-        assignments_series = assignments_series[assignments_series != ""]
-        assignments_options = sorted(assignments_series.astype(str).unique())
+        assignments_index = load_assignment_index(file_hash, subject_keywords, subject_regex, assignments_col, df)
+        assignments_options = assignment_options(df, assignments_col, assignments_index)
         
         if len(assignments_options) == 0:
             st.warning("İmtahan tapılmadı sütunda")
@@ -165,119 +337,152 @@ if uploaded_file:
                 placeholder="İmtahanları seçin",
                 help="Bir və ya daha çox imtahan seç"
             )
+            # One sheet / PDF section per selected exam, built from the same table
+            split_export = len(selected_assignments) > 1 and st.checkbox(
+                "Hər imtahan ayrıca vərəqdə",
+                help="Excel-də hər imtahan üçün ayrıca vərəq, PDF-də ayrıca bölmə yaradılır"
+            )
             
             if selected_assignments:
-                mask = df[assignments_col].astype(str).isin(selected_assignments)
-                filtered_df = df[mask]
+                filtered_df = select_assignments(df, assignments_col, selected_assignments, assignments_index)
                 st.write(f"Seçilmiş ({len(filtered_df)} nəticələr):")
+                lap("assignment filter")
                 
                 try:
-                    display_df = filtered_df.copy()
-                    for col in display_df.columns:
-                        if display_df[col].dtype in ['float64', 'float32', 'int64', 'int32']:
-                            numeric_vals = display_df[col].dropna()
-                            if len(numeric_vals) > 0 and numeric_vals.min() >= 0 and numeric_vals.max() <= 1:
-                                display_df[col] = display_df[col].apply(lambda x: f"{x*100:.1f}%" if pd.notna(x) else x)
-                    
-                    st.dataframe(
-                        display_df,
-                        use_container_width=True,
-                        height=1200
-                    )
+                    render_paginated(filtered_df, "filtered_table", percentage_cols, height=1200)
                 except Exception as e:
                     st.error(f"Error displaying filtered data: {e}")
+                lap("filtered table")
                 
-                email_col = None
-                for col_name in selected_headers:
-                    if col_name and "email" in col_name.lower():
-                        email_col = col_name
-                        break
+                email_col = roles.get("email")
                 
                 if email_col is None:
                     st.warning("Email ünvan sütunu yoxdur")
                     allow_download = False
                 else:
-                    duplicates_mask = filtered_df.duplicated(subset=[email_col], keep=False)
+                    # In split mode a student may appear once per exam
+                    group_col = assignments_col if split_export else None
+                    duplicates_key = duplicate_key(email_col, group_col)
+                    duplicates_mask = filtered_df.duplicated(subset=duplicates_key, keep=False)
                     duplicated_df = filtered_df[duplicates_mask]
                     
                     if len(duplicated_df) > 0:
                         st.warning(f"⚠️ {len(duplicated_df)} dənə eyni imtahan nəticəsi olan şagird tapıldı")
                         
-                        duplicate_groups = duplicated_df.groupby(email_col)
+                        duplicate_groups = duplicated_df.groupby(duplicates_key, observed=True)
                         
                         st.subheader("Eyni şagirdlərin yalnız bir nəticəsin seçin")
                         
+                        # Picks are kept as group key -> row fingerprint, so they stay valid when
+                        # filters change the row labels and never point at a row that is gone
                         if 'selected_duplicates' not in st.session_state:
                             st.session_state.selected_duplicates = {}
+                        if st.session_state.get("selections_workbook") != file_hash:
+                            st.session_state.selected_duplicates.update(load_selections(file_hash))
+                            st.session_state.selections_workbook = file_hash
                         
-                        final_df = filtered_df[~duplicates_mask].copy()
-                        all_selected = True
+                        duplicate_fingerprints = row_fingerprints(duplicated_df).tolist()
+                        # Identical rows share a fingerprint; the first of them stands for all
+                        fingerprint_labels = dict(zip(reversed(duplicate_fingerprints), reversed(duplicated_df.index)))
+                        label_fingerprints = dict(zip(duplicated_df.index, duplicate_fingerprints))
                         
-                        for email, group in duplicate_groups:
-                            st.write(f"**Email: {email}** ({len(group)} təkrar)")
-                            
-                            cols = st.columns(len(group))
-                            
-                            for i, (idx, row) in enumerate(group.iterrows()):
-                                with cols[i]:
-                                    is_selected = st.session_state.selected_duplicates.get(email) == idx
-                                    
-                                    summary_parts = []
-                                    
-                                    for col in group.columns[:3]:
-                                        val = row[col]
-                                        if val is not None and isinstance(val, (int, float)) and 0 <= val <= 1:
-                                            formatted_val = f"{val * 100:.1f}%"
-                                        else:
-                                            formatted_val = str(val)[:20] if val is not None else "None"
-                                        summary_parts.append(f"**{col}:** {formatted_val}")
-                                    
-                                    points_col = None
-                                    for col_name in group.columns:
-                                        if col_name and "point" in col_name.lower():
-                                            points_col = col_name
-                                            break
-                                    
-                                    if points_col and points_col not in group.columns[:3]:
-                                        points_val = row[points_col]
-                                        if points_val is not None and isinstance(points_val, (int, float)) and 0 <= points_val <= 1:
-                                            formatted_points = f"{points_val * 100:.1f}%"
-                                        else:
-                                            formatted_points = str(points_val) if points_val is not None else "None"
-                                        summary_parts.append(f"**{points_col}:** {formatted_points}")
-                                    
-                                    summary = "\n\n".join(summary_parts)
-                                    
-                                    if is_selected:
-                                        st.success(f"✅ **SEÇİLDİ**\n\n**Sıra {idx}**\n\n{summary}")
-                                    else:
-                                        st.error(f"❌ **Sıra {idx}**\n\n{summary}")
-                                    
-                                    if st.button(f"Seç Sıra {idx}", key=f"select_{email}_{idx}"):
-                                        st.session_state.selected_duplicates[email] = idx
-                                        st.rerun()
+                        # Column roles are resolved once; the kept rows are gathered as labels
+                        summary_cols = list(filtered_df.columns[:3])
+                        points_col = roles.get("points")
+                        score_col = score_column(roles)
+                        if points_col in summary_cols:
+                            points_col = None
+                        
+                        duplicate_policy = st.radio(
+                            "Təkrarların həlli",
+                            list(DUPLICATE_POLICIES),
+                            format_func=DUPLICATE_POLICIES.get,
+                            horizontal=True,
+                            help="Avtomatik qayda bütün təkrarları bir dəfəyə həll edir; əl ilə seçim onun üzərinə yazılır"
+                        )
+                        policy_selection = resolve_duplicates(filtered_df, email_col, duplicate_policy, score_col, group_col)
+                        
+                        selected_labels = {}
+                        for group_key, group_labels in duplicate_groups.groups.items():
+                            selected_idx = fingerprint_labels.get(st.session_state.selected_duplicates.get(group_key))
+                            if selected_idx not in group_labels:
+                                selected_idx = policy_selection.get(group_key)
+                            selected_labels[group_key] = selected_idx
+                        
+                        # All duplicates are reviewed in one editable table inside a form, so the page
+                        # renders a single component and reruns once per submission
+                        group_cols = [email_col] if group_col is None else [email_col, group_col]
+                        review_cols = list(dict.fromkeys(group_cols + summary_cols + ([points_col] if points_col else [])))
+                        review_rows = duplicated_df.sort_values(group_cols, kind="stable")
+                        review_df = format_percentages(
+                            review_rows[review_cols], [col for col in percentage_cols if col in review_cols])
+                        review_df.insert(0, REVIEW_ROW_COL, review_rows.index)
+                        review_df.insert(0, REVIEW_KEEP_COL, review_rows.index.isin(list(selected_labels.values())))
+                        
+                        review_version = st.session_state.get("duplicate_review_version", 0)
+                        with st.form("duplicate_review"):
+                            edited_df = st.data_editor(
+                                review_df,
+                                key=f"duplicate_review_{review_version}",
+                                hide_index=True,
+                                use_container_width=True,
+                                disabled=[col for col in review_df.columns if col != REVIEW_KEEP_COL],
+                                column_config={REVIEW_KEEP_COL: st.column_config.CheckboxColumn(
+                                    REVIEW_KEEP_COL, help="Hər şagird üçün bir nəticə saxlayın")},
+                            )
+                            submitted = st.form_submit_button("Seçimləri təsdiqlə")
+                        
+                        # Each group is judged on its own: one checked row is saved, several are
+                        # rejected, none leaves the group as it was, so partial work is never lost
+                        if submitted:
+                            keep_mask = edited_df[REVIEW_KEEP_COL].fillna(False).to_numpy(dtype=bool)
+                            keep_counts = pd.Series(keep_mask, index=review_rows.index).groupby(
+                                [review_rows[col] for col in group_cols], sort=False, observed=True).transform("sum")
+                            ambiguous_rows = review_rows[keep_mask & (keep_counts > 1).to_numpy()]
+                            if len(ambiguous_rows):
+                                ambiguous_groups = list(dict.fromkeys(
+                                    ambiguous_rows[email_col].tolist() if group_col is None
+                                    else zip(ambiguous_rows[email_col], ambiguous_rows[group_col])))
+                                st.session_state.duplicate_review_error = (
+                                    f"❌ {len(ambiguous_groups)} şagird üçün birdən çox nəticə seçilib, yalnız biri saxlanıla bilər: "
+                                    + ", ".join(map(str, ambiguous_groups[:5])) + (" …" if len(ambiguous_groups) > 5 else "")
+                                )
                             
-                            if email not in st.session_state.selected_duplicates:
-                                all_selected = False
-                            else:
-                                selected_idx = st.session_state.selected_duplicates[email]
-                                final_df = pd.concat([final_df, group.loc[[selected_idx]]])
+                            kept_rows = review_rows[keep_mask & (keep_counts == 1).to_numpy()]
+                            kept_keys = (kept_rows[email_col].tolist() if group_col is None
+                                         else list(zip(kept_rows[email_col], kept_rows[group_col])))
+                            changed_picks = {
+                                group_key: label_fingerprints[idx]
+                                for group_key, idx in zip(kept_keys, kept_rows.index)
+                                if selected_labels.get(group_key) != idx
+                            }
+                            if changed_picks:
+                                st.session_state.selected_duplicates.update(changed_picks)
+                                save_selections(file_hash, changed_picks)
+                                # A fresh editor key drops the submitted edits now baked into the table
+                                st.session_state.duplicate_review_version = review_version + 1
+                                st.rerun()
+                        
+                        # Kept across the rerun that applies the valid picks of the same submission
+                        review_error = st.session_state.pop("duplicate_review_error", None)
+                        if review_error:
+                            st.error(review_error)
+                        
+                        keep_idx = [idx for idx in selected_labels.values() if idx is not None]
+                        all_selected = len(keep_idx) == len(selected_labels)
+                        
+                        lap("duplicate review")
                         
                         if all_selected:
+                            final_df = filtered_df[~duplicates_mask | filtered_df.index.isin(keep_idx)]
                             st.success("✅ Təkrarlanan şagird adı yoxdur. Yükləyə bilərsiz!")
                             allow_download = True
                             final_filtered_df = final_df.reset_index(drop=True)
                             final_filtered_df.index = final_filtered_df.index + 1
                             
-                            final_display_df = final_filtered_df.copy()
-                            for col in final_display_df.columns:
-                                if final_display_df[col].dtype in ['float64', 'float32', 'int64', 'int32']:
-                                    numeric_vals = final_display_df[col].dropna()
-                                    if len(numeric_vals) > 0 and numeric_vals.min() >= 0 and numeric_vals.max() <= 1:
-                                        final_display_df[col] = final_display_df[col].apply(lambda x: f"{x*100:.1f}%" if pd.notna(x) else x)
-                            
                             st.write(f"Final data ({len(final_filtered_df)} rows after removing duplicates):")
-                            st.dataframe(final_display_df, use_container_width=True, height=400)
+                            render_paginated(final_filtered_df, "final_table", percentage_cols, height=400)
+                            lap("final table")
                         else:
                             st.error("❌ Yükləməzdən əvvəl təkrarları düzəldin")
                             allow_download = False
@@ -291,539 +496,85 @@ if uploaded_file:
                 st.write(f"Bütün ({len(filtered_df)} sıralar):")
                 
                 try:
-                    display_df = filtered_df.copy()
-                    for col in display_df.columns:
-                        if display_df[col].dtype in ['float64', 'float32', 'int64', 'int32']:
-                            numeric_vals = display_df[col].dropna()
-                            if len(numeric_vals) > 0 and numeric_vals.min() >= 0 and numeric_vals.max() <= 1:
-                                display_df[col] = display_df[col].apply(lambda x: f"{x*100:.1f}%" if pd.notna(x) else x)
-                    
-                    st.dataframe(
-                        display_df,
-                        use_container_width=True,
-                        height=1200
-                    )
+                    render_paginated(filtered_df, "filtered_table", percentage_cols, height=1200)
                 except Exception as e:
                     st.error(f"Error displaying filtered data: {e}")
+                lap("filtered table")
                 
                 allow_download = True
                 final_filtered_df = filtered_df
             
-            # Excel download function
-            def to_excel(df, title):
-                output = BytesIO()
-                try:
-                    excel_df = df.copy()
-                    percentage_columns = []
-                    
-                    for col in excel_df.columns:
-                        if excel_df[col].dtype in ['float64', 'float32', 'int64', 'int32']:
-                            numeric_vals = excel_df[col].dropna()
-                            if len(numeric_vals) > 0 and numeric_vals.min() >= 0 and numeric_vals.max() <= 1:
-                                percentage_columns.append(col)
-                    
-                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                        excel_df.to_excel(writer, index=False, sheet_name='FilteredData', startrow=1, startcol=0)
-                        
-                        workbook = writer.book
-                        worksheet = writer.sheets['FilteredData']
-
-                        content_font = Font(name='Segoe UI')
-                        header_fill = PatternFill(start_color='5B5FC7', end_color='5B5FC7', fill_type='solid')
-
-                        light_gray_fill = PatternFill(start_color='E7E7F7', end_color='E7E7F7', fill_type='solid')
-                        white_fill = PatternFill(start_color='FFFFFF', end_color='FFFFFF', fill_type='solid')
-
-                        for row in worksheet.iter_rows():
-                            for cell in row:
-                                cell.font = content_font
-                        
-                        for row in worksheet.iter_rows(min_row=1, max_row=2):
-                            for cell in row:
-                                cell.fill = header_fill
-
-                        header_row = worksheet[2]
-                        for cell in header_row:
-                            cell.font = Font(name='Segoe UI', bold=True, color='FFFFFF')
-
-                        if title:
-                            title_cell_obj = worksheet.cell(row=1, column=1, value=title)
-                            title_cell_obj.font = Font(name='Segoe UI', size=18, bold=True, color='FFFFFF')
-                         
-                        for row_index, row in enumerate(worksheet.iter_rows(min_row=3, max_row=len(excel_df) + 2)):
-                            fill = light_gray_fill if row_index % 2 == 0 else white_fill
-                            for cell in row:
-                                cell.fill = fill
-
-                        manual_widths = {'A': 30, 'C': 35}
-
-                        for i, column_name in enumerate(excel_df.columns):
-                            column_letter = get_column_letter(i + 1)
-                            
-                            if column_letter in manual_widths:
-                                worksheet.column_dimensions[column_letter].width = manual_widths[column_letter]
-                            else:
-                                max_length = 0
-                                for cell in worksheet[column_letter]:
-                                    try:
-                                        if len(str(cell.value)) > max_length:
-                                            max_length = len(str(cell.value))
-                                    except:
-                                        pass
-                                adjusted_width = (max_length + 2)
-                                worksheet.column_dimensions[column_letter].width = adjusted_width
-
-                        filter_range = f'A2:{get_column_letter(len(excel_df.columns))}2'
-                        worksheet.auto_filter.ref = filter_range
-
-                        if percentage_columns:
-                            for col_name in percentage_columns:
-                                try:
-                                    col_idx = list(excel_df.columns).index(col_name) + 1
-                                    for row in range(3, len(excel_df) + 3):
-                                        cell = worksheet.cell(row=row, column=col_idx)
-                                        if cell.value is not None:
-                                            cell.number_format = '0.0%'
-                                except Exception as col_error:
-                                    print(f"Error formatting column {col_name}: {col_error}")
-                    
-                    output.seek(0)
-                    return output
-                except Exception as e:
-                    st.error(f"Error creating Excel file: {e}")
-                    return None
-            # PDF download function
-            def to_pdf(df, title):
-                output = BytesIO()
-                try:
-                    doc = SimpleDocTemplate(output, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch,
-                                          leftMargin=0.5*inch, rightMargin=0.5*inch)
-
-                    styles = getSampleStyleSheet()
-
-                    try:
-                        pdfmetrics.registerFont(TTFont('Segoe UI', 'fonts/segoeuithis.ttf'))
-                        pdfmetrics.registerFont(TTFont('Segoe UI-Bold', 'fonts/segoeuithibd.ttf'))
-                        font_name = 'Segoe UI'
-                        font_name_bold = 'Segoe UI-Bold'
-                    except Exception as e:
-                        st.error(f"Noto Sans fonts could not be loaded: {e}")
-                        st.error("Make sure fonts/NotoSans-Regular.ttf and fonts/NotoSans-Bold.ttf exist")
-                        return None
-
-                    title_style = ParagraphStyle(
-                        'CustomTitle',
-                        fontName=font_name_bold,
-                        parent=styles['Heading1'],
-                        fontSize=16,
-                        spaceAfter=20,
-                        alignment=1,
-                        textColor=colors.HexColor('#5B5FC7')
-                    )
-
-                    story = []
-                    if title:
-                        title_text = str(title) if title else ""
-                        title_para = Paragraph(title_text, title_style)
-                        story.append(title_para)
-                        story.append(Spacer(1, 12))
-
-                    pdf_df = df.copy()
-
-                    # --- MODIFICATION START: Direct character removal ---
-                    # This is the most reliable way to fix the double-dot 'i' problem.
-                    # It removes the combining dot character U+0307 from all string columns.
-                    problematic_char = '\u0307' # Unicode for COMBINING DOT ABOVE
-                    for col in pdf_df.columns:
-                        if pd.api.types.is_string_dtype(pdf_df[col]):
-                            pdf_df[col] = pdf_df[col].astype(str).str.replace(problematic_char, '', regex=False)
-                    # --- MODIFICATION END ---
-                    
-                    first_col_index = 0
-                    long_content_col_indices = []
-                    short_content_col_indices = []
-                    
-                    for i, col in enumerate(pdf_df.columns):
-                        col_name_lower = str(col).lower()
-                        if i == first_col_index:
-                            pass
-                        elif "assignment" in col_name_lower or "email" in col_name_lower:
-                            long_content_col_indices.append(i)
-                        else:
-                            short_content_col_indices.append(i)
-
-                    for col in pdf_df.columns:
-                        if pdf_df[col].dtype in ['float64', 'float32', 'int64', 'int32']:
-                            numeric_vals = pdf_df[col].dropna()
-                            if len(numeric_vals) > 0 and numeric_vals.min() >= 0 and numeric_vals.max() <= 1:
-                                pdf_df[col] = pdf_df[col].apply(lambda x: f"{x*100:.1f}%" if pd.notna(x) else "")
-                    
-                    first_col_style = ParagraphStyle(
-                        'FirstColStyle',
-                        fontName=font_name,
-                        fontSize=9,
-                        alignment=0,
-                        leading=11
-                    )
-                    long_col_style = ParagraphStyle(
-                        'LongColStyle',
-                        fontName=font_name,
-                        fontSize=8,
-                        alignment=0,
-                        leading=10
-                    )
-                    
-                    data = []
-                    headers = [str(col) if col is not None else "" for col in pdf_df.columns]
-                    data.append(headers)
-
-                    for _, row in pdf_df.iterrows():
-                        row_data = []
-                        for i, val in enumerate(row):
-                            cell_text = str(val) if val is not None else ""
-                            
-                            if i == first_col_index:
-                                wrapped_text = Paragraph(cell_text, first_col_style)
-                                row_data.append(wrapped_text)
-                            elif i in long_content_col_indices and len(cell_text) > 20:
-                                wrapped_text = Paragraph(cell_text, long_col_style)
-                                row_data.append(wrapped_text)
-                            else:
-                                row_data.append(cell_text)
-                        data.append(row_data)
-
-                    page_width = A4[0] - 2 * 0.5 * inch
-                    num_cols = len(pdf_df.columns)
-                    
-                    col_widths = [0] * num_cols
-                    
-                    first_col_width = 1.5 * inch
-                    col_widths[first_col_index] = first_col_width
-                    
-                    long_col_width = 1.2 * inch
-                    for i in long_content_col_indices:
-                        col_widths[i] = long_col_width
-                        
-                    total_assigned_width = first_col_width + (len(long_content_col_indices) * long_col_width)
-                    remaining_width = page_width - total_assigned_width
-                    
-                    num_short_cols = len(short_content_col_indices)
-                    if num_short_cols > 0:
-                        short_col_width = remaining_width / num_short_cols
-                        for i in short_content_col_indices:
-                            col_widths[i] = short_col_width
-
-                    table = Table(data, colWidths=col_widths)
-
-                    table_style = [
-                        ('FONTNAME', (0, 0), (-1, 0), font_name_bold),
-                        ('FONTNAME', (0, 1), (-1, -1), font_name),
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#5B5FC7')),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                        ('FONTSIZE', (0, 0), (-1, 0), 10),
-                        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                        ('FONTSIZE', (0, 1), (-1, -1), 9),
-                        ('ALIGN', (first_col_index, 1), (first_col_index, -1), 'LEFT'),
-                        ('VALIGN', (first_col_index, 1), (first_col_index, -1), 'TOP'),
-                        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#E7E7F7')]),
-                    ]
-
-                    for col_index in long_content_col_indices:
-                        table_style.append(('ALIGN', (col_index, 1), (col_index, -1), 'LEFT'))
-                        table_style.append(('VALIGN', (col_index, 1), (col_index, -1), 'TOP'))
-                    
-                    for col_index in short_content_col_indices:
-                        table_style.append(('ALIGN', (col_index, 1), (col_index, -1), 'CENTER'))
-                        table_style.append(('VALIGN', (col_index, 1), (col_index, -1), 'MIDDLE'))
-
-                    table.setStyle(TableStyle(table_style))
-
-                    story.append(table)
-
-                    footer_style = ParagraphStyle(
-                        'Footer',
-                        fontName=font_name,
-                        parent=styles['Normal'],
-                        fontSize=8,
-                        spaceAfter=12,
-                        alignment=1,
-                        textColor=colors.grey
-                    )
-
-                    story.append(Spacer(1, 20))
-                    footer_text = f"Nəticələr sayı: {len(pdf_df)} | Yaradılma tarixi: {pd.Timestamp.now().strftime('%d.%m.%Y %H:%M')}"
-                    footer_para = Paragraph(footer_text, footer_style)
-                    story.append(footer_para)
-
-                    doc.build(story)
-                    output.seek(0)
-                    return output
-
-                except Exception as e:
-                    st.error(f"PDF yaradılarkən xəta: {e}")
-                    return None
-            # Add this function after your existing to_pdf function
-
-            def to_pdf_landscape(df, title):
-                output = BytesIO()
-                try:
-                    # Use landscape orientation - swap width and height of A4
-                    doc = SimpleDocTemplate(output, pagesize=(A4[1], A4[0]), topMargin=0.5*inch, bottomMargin=0.5*inch,
-                                          leftMargin=0.5*inch, rightMargin=0.5*inch)
-
-                    styles = getSampleStyleSheet()
-
-                    try:
-                        pdfmetrics.registerFont(TTFont('Segoe UI', 'fonts/segoeuithis.ttf'))
-                        pdfmetrics.registerFont(TTFont('Segoe UI-Bold', 'fonts/segoeuithibd.ttf'))
-                        font_name = 'Segoe UI'
-                        font_name_bold = 'Segoe UI-Bold'
-                    except Exception as e:
-                        st.error(f"Noto Sans fonts could not be loaded: {e}")
-                        st.error("Make sure fonts/NotoSans-Regular.ttf and fonts/NotoSans-Bold.ttf exist")
-                        return None
-
-                    title_style = ParagraphStyle(
-                        'CustomTitle',
-                        fontName=font_name_bold,
-                        parent=styles['Heading1'],
-                        fontSize=16,
-                        spaceAfter=20,
-                        alignment=1,
-                        textColor=colors.HexColor('#5B5FC7')
-                    )
-
-                    story = []
-                    if title:
-                        title_text = str(title) if title else ""
-                        title_para = Paragraph(title_text, title_style)
-                        story.append(title_para)
-                        story.append(Spacer(1, 12))
-
-                    pdf_df = df.copy()
-
-                    # Remove problematic characters
-                    problematic_char = '\u0307' # Unicode for COMBINING DOT ABOVE
-                    for col in pdf_df.columns:
-                        if pd.api.types.is_string_dtype(pdf_df[col]):
-                            pdf_df[col] = pdf_df[col].astype(str).str.replace(problematic_char, '', regex=False)
-                    
-                    # Format percentage columns
-                    for col in pdf_df.columns:
-                        if pdf_df[col].dtype in ['float64', 'float32', 'int64', 'int32']:
-                            numeric_vals = pdf_df[col].dropna()
-                            if len(numeric_vals) > 0 and numeric_vals.min() >= 0 and numeric_vals.max() <= 1:
-                                pdf_df[col] = pdf_df[col].apply(lambda x: f"{x*100:.1f}%" if pd.notna(x) else "")
-                    
-                    # Simple paragraph style for all content
-                    content_style = ParagraphStyle(
-                        'ContentStyle',
-                        fontName=font_name,
-                        fontSize=10,
-                        alignment=0,
-                        leading=12
-                    )
-                    
-                    data = []
-                    headers = [str(col) if col is not None else "" for col in pdf_df.columns]
-                    data.append(headers)
-
-                    # Add data rows - wrap longer content in paragraphs
-                    for _, row in pdf_df.iterrows():
-                        row_data = []
-                        for val in row:
-                            cell_text = str(val) if val is not None else ""
-                            # Wrap longer text content in paragraphs for better formatting
-                            if len(cell_text) > 30:
-                                wrapped_text = Paragraph(cell_text, content_style)
-                                row_data.append(wrapped_text)
-                            else:
-                                row_data.append(cell_text)
-                        data.append(row_data)
-
-                    # Calculate page width for landscape (A4 height becomes width)
-                    page_width = A4[1] - 2 * 0.5 * inch
-                    num_cols = len(pdf_df.columns)
-                    
-                    # Smart column width distribution for landscape
-                    col_widths = [0] * num_cols
-                    
-                    # Identify column types based on names and content
-                    first_col_index = 0         # First column (likely full names) - needs extra width
-                    short_numeric_cols = []     # Points, Max Points, Percent - these need less width
-                    long_content_cols = []      # Columns with longer text content
-                    regular_cols = []           # Everything else
-                    
-                    for i, col_name in enumerate(pdf_df.columns):
-                        col_name_lower = str(col_name).lower()
-                        if i == first_col_index:
-                            # First column handled separately
-                            continue
-                        elif any(keyword in col_name_lower for keyword in ['point', 'percent', 'max']):
-                            short_numeric_cols.append(i)
-                        elif i == 2 or any(keyword in col_name_lower for keyword in ['assignment', 'email']):
-                            # Third column (index 2) or columns with typically longer content
-                            long_content_cols.append(i)
-                        else:
-                            regular_cols.append(i)
-                    
-                    # Allocate widths: first column gets extra width, short numeric cols get less, long content cols get more
-                    first_col_width = 1.8 * inch      # Extra width for full names
-                    short_col_width = 0.8 * inch      # Narrow columns for numeric data
-                    regular_col_width = 1.2 * inch    # Regular width
-                    
-                    # Calculate remaining width for long content columns
-                    used_width = (first_col_width + 
-                                 len(short_numeric_cols) * short_col_width + 
-                                 len(regular_cols) * regular_col_width)
-                    remaining_width = page_width - used_width
-                    
-                    if len(long_content_cols) > 0:
-                        long_col_width = remaining_width / len(long_content_cols)
-                    else:
-                        long_col_width = regular_col_width
-                    
-                    # Assign widths
-                    for i in range(num_cols):
-                        if i == first_col_index:
-                            col_widths[i] = first_col_width
-                        elif i in short_numeric_cols:
-                            col_widths[i] = short_col_width
-                        elif i in long_content_cols:
-                            col_widths[i] = long_col_width
-                        else:
-                            col_widths[i] = regular_col_width
-
-                    table = Table(data, colWidths=col_widths)
-
-                    table_style = [
-                        ('FONTNAME', (0, 0), (-1, 0), font_name_bold),
-                        ('FONTNAME', (0, 1), (-1, -1), font_name),
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#5B5FC7')),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                        ('FONTSIZE', (0, 0), (-1, 0), 11),
-                        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                        ('FONTSIZE', (0, 1), (-1, -1), 10),
-                        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#E7E7F7')]),
-                    ]
-
-                    # Apply left alignment and top valignment for long content columns and first column
-                    for col_index in long_content_cols:
-                        table_style.append(('ALIGN', (col_index, 1), (col_index, -1), 'LEFT'))
-                        table_style.append(('VALIGN', (col_index, 1), (col_index, -1), 'TOP'))
-                    
-                    # First column (names) should also be left-aligned and top-aligned
-                    table_style.append(('ALIGN', (first_col_index, 1), (first_col_index, -1), 'LEFT'))
-                    table_style.append(('VALIGN', (first_col_index, 1), (first_col_index, -1), 'TOP'))
-
-                    table.setStyle(TableStyle(table_style))
-                    story.append(table)
-
-                    footer_style = ParagraphStyle(
-                        'Footer',
-                        fontName=font_name,
-                        parent=styles['Normal'],
-                        fontSize=8,
-                        spaceAfter=12,
-                        alignment=1,
-                        textColor=colors.grey
-                    )
-
-                    story.append(Spacer(1, 20))
-                    footer_text = f"Nəticələr sayı: {len(pdf_df)} | Yaradılma tarixi: {pd.Timestamp.now().strftime('%d.%m.%Y %H:%M')}"
-                    footer_para = Paragraph(footer_text, footer_style)
-                    story.append(footer_para)
-
-                    doc.build(story)
-                    output.seek(0)
-                    return output
-
-                except Exception as e:
-                    st.error(f"PDF yaradılarkən xəta: {e}")
-                    return None
-
-
             # Replace the existing download button section with this updated version:
 
+            export_errors = st.session_state.setdefault("export_errors", [])
+            for export_error in export_errors:
+                st.error(export_error)
+            export_errors.clear()
+
             # Create download buttons (only if duplicates are resolved)
             if allow_download:
-                original_filename = uploaded_file.name
-                trimmed_year = original_filename[:5]
-
-                def trim_until_variant(s):
-                    lower_s = s.lower()
-                    idx = lower_s.find("variant")
-                    if idx != -1:
-                        return s[:idx]
-                    else:
-                        return s
-
-                if selected_assignments:
-                    first_filter = str(selected_assignments[0])
-                    filter_part = trim_until_variant(first_filter)
+                filter_part = export_filter_part(selected_assignments)
+                export_names = export_filenames(uploaded_file.name, filter_part)
+                excel_filename = export_names["excel"]
+                pdf_filename = export_names["pdf"]
+                pdf_landscape_filename = export_names["pdf_landscape"]
+
+                # Split exports title each section by its own exam
+                if split_export:
+                    split_col, split_assignments = assignments_col, selected_assignments
                 else:
-                    filter_part = "unfiltered"
-                
+                    split_col, split_assignments = None, ()
+                    title_cell = export_title(title_cell, filter_part)
 
-                excel_filename = f"{trimmed_year}{filter_part}.xlsx"
-                pdf_filename = f"{trimmed_year}{filter_part}_dik.pdf"
-                pdf_landscape_filename = f"{trimmed_year}{filter_part}.pdf"
-
-
-                title_cell = title_cell[:-15] + filter_part
-
-                excel_data = to_excel(final_filtered_df, title_cell)
-                pdf_data = to_pdf(final_filtered_df, title_cell)
-                pdf_landscape_data = to_pdf_landscape(final_filtered_df, title_cell)
+                # Each button builds its file only when clicked; repeat clicks hit the cache
+                final_fingerprint = frame_fingerprint(final_filtered_df)
+                col1, col2, col3, col4 = st.columns(4)
                 
-                # Generate filenames
-
-                
-                # Create three columns for the buttons
-                col1, col2, col3 = st.columns(3)
-                
-                # Excel button
-                if excel_data:
-                    with col1:
-                        st.download_button(
-                            label="📊 Excel faylını yüklə",
-                            data=excel_data,
-                            file_name=excel_filename,
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
+                with col1:
+                    st.download_button(
+                        label="📊 Excel faylını yüklə",
+                        data=lazy_export("excel", final_filtered_df, title_cell, final_fingerprint, percentage_cols,
+                                         split_col, split_assignments, roles=roles),
+                        file_name=excel_filename,
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                        on_click="ignore"
+                    )
                 
-                # PDF Portrait button
-                if pdf_data:
-                    with col2:
-                        st.download_button(
-                            label="📄 PDF (Dikinə)",
-                            data=pdf_data,
-                            file_name=pdf_filename,
-                            mime="application/pdf"
-                        )
+                with col2:
+                    st.download_button(
+                        label="📄 PDF (Dikinə)",
+                        data=lazy_export("pdf", final_filtered_df, title_cell, final_fingerprint, percentage_cols,
+                                         split_col, split_assignments, roles=roles),
+                        file_name=pdf_filename,
+                        mime="application/pdf",
+                        on_click="ignore"
+                    )
                 
-                # PDF Landscape button
-                if pdf_landscape_data:
-                    with col3:
-                        st.download_button(
-                            label="📄 PDF (Üfüqi)",
-                            data=pdf_landscape_data,
-                            file_name=pdf_landscape_filename,
-                            mime="application/pdf"
-                        )
+                with col3:
+                    st.download_button(
+                        label="📄 PDF (Üfüqi)",
+                        data=lazy_export("pdf_landscape", final_filtered_df, title_cell, final_fingerprint, percentage_cols,
+                                         split_col, split_assignments, roles=roles),
+                        file_name=pdf_landscape_filename,
+                        mime="application/pdf",
+                        on_click="ignore"
+                    )
                 
-                # Show warning if any format failed to generate
-                if not excel_data:
-                    st.warning("Excel faylı yaradıla bilmədi")
-                if not pdf_data:
-                    st.warning("PDF (Dik) faylı yaradıla bilmədi")
-                if not pdf_landscape_data:
-                    st.warning("PDF (Üfüqi) faylı yaradıla bilmədi")
+                # All three files in one archive, prepared in a single pass over the frame
+                with col4:
+                    st.download_button(
+                        label="🗂️ Hamısı (ZIP)",
+                        data=lazy_export("zip", final_filtered_df, title_cell, final_fingerprint, percentage_cols,
+                                         split_col, split_assignments, export_names, roles),
+                        file_name=export_names["zip"],
+                        mime="application/zip",
+                        on_click="ignore"
+                    )
+                lap("download buttons")
             else:
-                st.error("❌ Yükləmək olmaz. Təkrarları aradan qaldırın.")
\ No newline at end of file
+                st.error("❌ Yükləmək olmaz. Təkrarları aradan qaldırın.")
+
+if profile is not None:
+    lap("rest")
+    profile.finish(upload=[uploaded.name for uploaded in uploaded_files] if uploaded_files else None)
+    render_profile_panel(profile)
\ No newline at end of file
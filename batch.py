@@ -0,0 +1,217 @@
+import argparse
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from glob import glob
+
+from gradebook import (
+    TITLE_CELL, COLUMN_ROLES, DEFAULT_SUBJECT_KEYWORDS, compile_subject_filter,
+    subject_filter_counts, score_column, assignment_index, assignment_options, select_assignments,
+    assignment_sections, resolve_duplicates, drop_unselected_duplicates, export_filter_part,
+    export_filenames, export_title, section_title,
+)
+from gradebook_cache import read_gradebook_cached
+from exports import EXPORT_BUILDERS, ExportScheduler
+
+
+# Headless version of the app pipeline: load -> filter -> select -> dedupe -> export
+def result_sets(df, assignments_col, assignment_filters):
+    if not assignment_filters or assignments_col is None:
+        return [(None, [], df)]
+
+    index = assignment_index(df, assignments_col)
+    options = assignment_options(df, assignments_col, index)
+    sets = []
+    for assignment_filter in assignment_filters:
+        needle = assignment_filter.lower()
+        selected = [option for option in options if needle in option.lower()]
+        if selected:
+            sets.append((assignment_filter, selected, select_assignments(df, assignments_col, selected, index)))
+    return sets
+
+
+# Names only use the first assignment up to "variant", so two filters can map to the same file;
+# later ones get their filter (and if needed a counter) appended instead of overwriting
+FILENAME_UNSAFE = re.compile(r'[^\w.-]+')
+
+
+def unique_export_filenames(original_filename, filter_part, assignment_filter, used_names):
+    base = filter_part
+    if assignment_filter:
+        base = f"{filter_part}_{FILENAME_UNSAFE.sub('_', assignment_filter).strip('_')}"
+    candidates = itertools.chain([filter_part, base], (f"{base}_{counter}" for counter in itertools.count(2)))
+    for candidate in candidates:
+        names = export_filenames(original_filename, candidate)
+        # Compared case-insensitively, as on Windows and macOS file systems
+        lowered = {name.lower() for name in names.values()}
+        if not lowered & used_names:
+            used_names.update(lowered)
+            return names
+
+
+def prepare_workbook(path, assignment_filters, policy, split=False, column_roles=None, title_coordinate=TITLE_CELL,
+                     subject_keywords=DEFAULT_SUBJECT_KEYWORDS, subject_regex=None, cache_dir=None, all_sheets=False):
+    started = time.perf_counter()
+    subject_filter = compile_subject_filter(subject_keywords, subject_regex)
+    title_cell, selected_headers, df, total_rows_count, filtered_rows_count, percentage_cols, roles = read_gradebook_cached(
+        path, None, column_roles, title_coordinate, subject_filter, cache_dir, all_sheets)
+
+    assignments_col = roles.get("assignment")
+    subject_counts = subject_filter_counts(df, assignments_col, subject_keywords, subject_regex)
+    email_col = roles.get("email")
+    score_col = score_column(roles)
+
+    # Split reports get one sheet / PDF section per assignment and dedupe within each assignment
+    split_col = assignments_col if split else None
+
+    report_sets = []
+    used_names = set()
+    for assignment_filter, selected_assignments, filtered_df in result_sets(df, assignments_col, assignment_filters):
+        # Like the app, the unfiltered set keeps every row: one student's different exams are not duplicates
+        if email_col is not None and selected_assignments:
+            selection = resolve_duplicates(filtered_df, email_col, policy, score_col, split_col)
+            filtered_df = drop_unselected_duplicates(filtered_df, email_col, selection, split_col)
+
+        filter_part = export_filter_part(selected_assignments)
+        names = unique_export_filenames(os.path.basename(path), filter_part, assignment_filter, used_names)
+        title = export_title(title_cell, filter_part)
+        sections = None
+        if split_col is not None:
+            section_assignments = selected_assignments or assignment_options(filtered_df, split_col)
+            sections = [
+                (assignment, section_title(title_cell, assignment), positions)
+                for assignment, positions in assignment_sections(filtered_df, split_col, section_assignments)
+            ]
+        report_sets.append((names, title, filtered_df, percentage_cols, sections, roles))
+
+    return total_rows_count, filtered_rows_count, subject_counts, report_sets, time.perf_counter() - started
+
+
+# Workbooks are parsed and every (result set, format) export is built on one process pool
+def process_workbooks(paths, output_dir, formats, workers=None, **prepare_options):
+    results = {path: {"written": [], "timings": {"parse": 0.0, "export": 0.0}} for path in paths}
+    pending = {}
+
+    with ExportScheduler(workers) as scheduler:
+        for path in paths:
+            pending[scheduler.submit_task(prepare_workbook, path, **prepare_options)] = ("parse", path, None)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, path, target = pending.pop(future)
+                result = results[path]
+                if "error" in result:
+                    continue
+                try:
+                    if stage == "parse":
+                        total_rows, kept_rows, subject_counts, report_sets, parse_seconds = future.result()
+                        result.update(total_rows=total_rows, kept_rows=kept_rows, subject_counts=subject_counts)
+                        result["timings"]["parse"] = parse_seconds
+
+                        # Scheme names only use the first five characters, so each workbook gets its own folder
+                        workbook_dir = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0])
+                        os.makedirs(workbook_dir, exist_ok=True)
+                        for names, title, report_df, percentage_cols, sections, roles in report_sets:
+                            for export_format in formats:
+                                export_future = scheduler.submit(export_format, report_df, title, percentage_cols,
+                                                                 sections, roles)
+                                pending[export_future] = ("export", path, os.path.join(workbook_dir, names[export_format]))
+                            scheduler.release(report_df)
+                    else:
+                        data, export_seconds = future.result()
+                        with open(target, "wb") as f:
+                            f.write(data)
+                        result["written"].append(target)
+                        result["timings"]["export"] += export_seconds
+                except Exception as e:
+                    result["error"] = e
+
+    for result in results.values():
+        result["timings"]["total"] = result["timings"]["parse"] + result["timings"]["export"]
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a folder of gradebook workbooks into Excel/PDF reports.")
+    parser.add_argument("input_dir", help="folder with .xlsx gradebook exports")
+    parser.add_argument("-o", "--output-dir", default="reports", help="where reports are written (default: reports)")
+    parser.add_argument("-a", "--assignment", action="append", dest="assignments", default=[],
+                        help="case-insensitive assignment filter; repeat for one report set per filter")
+    parser.add_argument("--policy", choices=["best", "last", "first"], default="best",
+                        help="how duplicated emails are resolved (default: best)")
+    parser.add_argument("--formats", nargs="+", choices=list(EXPORT_BUILDERS), default=list(EXPORT_BUILDERS),
+                        help="export formats to build (default: all)")
+    parser.add_argument("-s", "--subject", action="append", dest="subjects", default=None,
+                        help="keep assignments containing this keyword; repeatable "
+                             f"(default: {', '.join(DEFAULT_SUBJECT_KEYWORDS)})")
+    parser.add_argument("--subject-regex", help="keep assignments matching this case-insensitive regex instead")
+    parser.add_argument("--all-subjects", action="store_true", help="keep every assignment")
+    parser.add_argument("--split", action="store_true",
+                        help="one Excel sheet / PDF section per assignment instead of one merged table")
+    parser.add_argument("--columns", metavar="JSON_FILE",
+                        help="column role overrides, e.g. {\"email\": {\"keywords\": [\"mail\"], \"column\": 3}}")
+    parser.add_argument("--all-sheets", action="store_true",
+                        help="also read every other sheet laid out like a gradebook and merge it into one report")
+    parser.add_argument("--title-cell", default=TITLE_CELL, help=f"cell holding the report title (default: {TITLE_CELL})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always parse the workbooks instead of using the Parquet cache (GRADES_CACHE_DIR)")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="worker processes for parsing and exports (default: GRADES_EXPORT_WORKERS or CPU count)")
+    args = parser.parse_args(argv)
+
+    paths = sorted(
+        path for path in glob(os.path.join(args.input_dir, "*.xlsx"))
+        if not os.path.basename(path).startswith("~$")
+    )
+    if not paths:
+        print(f"No .xlsx files found in {args.input_dir}", file=sys.stderr)
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    subject_keywords = DEFAULT_SUBJECT_KEYWORDS if args.subjects is None else args.subjects
+    if args.all_subjects:
+        subject_keywords, args.subject_regex = [], None
+    try:
+        compile_subject_filter(subject_keywords, args.subject_regex)
+    except re.error as e:
+        parser.error(f"invalid --subject-regex: {e}")
+
+    column_roles = None
+    if args.columns:
+        with open(args.columns, encoding="utf-8") as f:
+            column_roles = {**COLUMN_ROLES, **json.load(f)}
+
+    batch_started = time.perf_counter()
+    results = process_workbooks(
+        paths, args.output_dir, args.formats, args.workers,
+        assignment_filters=args.assignments, policy=args.policy, split=args.split,
+        column_roles=column_roles, title_coordinate=args.title_cell,
+        subject_keywords=subject_keywords, subject_regex=args.subject_regex,
+        cache_dir="" if args.no_cache else None, all_sheets=args.all_sheets,
+    )
+
+    failures = 0
+    for path in paths:
+        name = os.path.basename(path)
+        result = results[path]
+        if "error" in result:
+            failures += 1
+            print(f"{name}: FAILED ({result['error']})", file=sys.stderr)
+            continue
+        timings = result["timings"]
+        print(f"{name}: {result['kept_rows']}/{result['total_rows']} rows kept, {len(set(result['written']))} files | "
+              f"parse {timings['parse']:.2f}s, export {timings['export']:.2f}s, total {timings['total']:.2f}s")
+        if result["subject_counts"]:
+            print("  " + ", ".join(f"{subject}: {count}" for subject, count in result["subject_counts"].items()))
+
+    print(f"{len(paths) - failures}/{len(paths)} workbooks processed in {time.perf_counter() - batch_started:.2f}s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
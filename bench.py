@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import openpyxl
+
+from gradebook import read_gradebook, score_column, resolve_duplicates, drop_unselected_duplicates
+from exports import EXPORT_BUILDERS
+
+
+# Synthetic gradebooks in the LMS export layout: title in D1, headers in row 2, results from row 3
+BENCH_SIZES = [1_000, 10_000, 100_000]
+BENCH_STAGES = ["ingest", "dedupe"] + list(EXPORT_BUILDERS)
+BENCH_HEADERS = {4: "Ad Soyad", 7: "Email", 8: "Assignments", 13: "Points", 14: "Max Points", 15: "Percent"}
+BENCH_ASSIGNMENTS = [
+    "Riyaziyyat Variant A",
+    "Riyaziyyat Variant B",
+    "Riyaziyyat yekun qiymətləndirmə (II yarımil) Variant C",
+    "İnformatika Riyaziyyat sınaq",
+    "Fizika test",
+    "Kimya laboratoriya işi",
+]
+BENCH_FIRST_NAMES = ["Əli", "Leyla", "Günel", "Şahin", "İsmayıl", "Nərmin", "Çingiz", "Aysel", "Ülvi", "Xədicə"]
+BENCH_LAST_NAMES = ["Məmmədov", "Əliyeva", "Hüseynov", "Qasımova", "İsmayılzadə", "Şükürov", "Quliyeva"]
+
+
+def generate_workbook(path, rows, seed=0, duplicate_ratio=0.2):
+    rng = random.Random(seed)
+    # Roughly duplicate_ratio of the rows reuse an email that already took the same exam
+    students = max(1, int(rows * (1 - duplicate_ratio)))
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([None] * 3 + ["10-cu sinif Riyaziyyat yekun 2024-10-10 12:00"])
+    header = [None] * max(BENCH_HEADERS)
+    for col, name in BENCH_HEADERS.items():
+        header[col - 1] = name
+    ws.append(header)
+
+    for _ in range(rows):
+        student = rng.randrange(students)
+        name_rng = random.Random(student)
+        full_name = f"{name_rng.choice(BENCH_FIRST_NAMES)} {name_rng.choice(BENCH_LAST_NAMES)} {student}"
+        max_points = 20
+        points = rng.randint(0, max_points)
+        row = [None] * max(BENCH_HEADERS)
+        row[3] = full_name
+        row[6] = f"s{student}@school.az"
+        row[7] = rng.choice(BENCH_ASSIGNMENTS)
+        row[12] = points
+        row[13] = max_points
+        row[14] = points / max_points
+        ws.append(row)
+
+    wb.save(path)
+    return path
+
+
+# tracemalloc slows allocation-heavy stages several times over, so the peak is taken on a
+# separate traced run and the timing always comes from an untraced one
+def measure(stage_fn, memory):
+    started = time.perf_counter()
+    result = stage_fn()
+    seconds = time.perf_counter() - started
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            stage_fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, seconds, peak
+
+
+def run_size(path, rows, stages, memory):
+    results = []
+
+    def record(stage, seconds, peak, stage_rows):
+        results.append({
+            "rows": rows,
+            "stage": stage,
+            "seconds": seconds,
+            "rows_per_second": stage_rows / seconds if seconds else None,
+            "peak_mb": None if peak is None else peak / 1024 / 1024,
+        })
+
+    # Ingest and dedupe always run because later stages need their output
+    parsed, seconds, peak = measure(lambda: read_gradebook(path), memory and "ingest" in stages)
+    title_cell, selected_headers, df, total_rows_count, filtered_rows_count, percentage_cols, roles = parsed
+    if "ingest" in stages:
+        record("ingest", seconds, peak, total_rows_count)
+
+    email_col = roles.get("email")
+    score_col = score_column(roles)
+
+    def dedupe():
+        selection = resolve_duplicates(df, email_col, "best", score_col)
+        return drop_unselected_duplicates(df, email_col, selection)
+
+    final_df, seconds, peak = measure(dedupe, memory and "dedupe" in stages)
+    if "dedupe" in stages:
+        record("dedupe", seconds, peak, len(df))
+
+    for export_format, builder in EXPORT_BUILDERS.items():
+        if export_format in stages:
+            _, seconds, peak = measure(lambda: builder(final_df, title_cell, percentage_cols, roles=roles), memory)
+            record(export_format, seconds, peak, len(final_df))
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time ingest, dedupe and the exporters on synthetic gradebooks.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=BENCH_SIZES,
+                        help="workbook sizes in rows (default: 1000 10000 100000)")
+    parser.add_argument("--stages", nargs="+", choices=BENCH_STAGES, default=BENCH_STAGES,
+                        help="stages to report (default: all)")
+    parser.add_argument("--workdir", help="where generated workbooks are kept (default: a temp dir)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the traced second run that measures peak memory")
+    parser.add_argument("--json", metavar="FILE", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="gradebook-bench-")
+    os.makedirs(workdir, exist_ok=True)
+
+    print(f"{'rows':>8}  {'stage':<14}{'seconds':>9}{'rows/s':>12}{'peak MB':>9}")
+    all_results = []
+    for rows in args.sizes:
+        path = os.path.join(workdir, f"bench_{rows}_{args.seed}.xlsx")
+        if not os.path.exists(path):
+            generate_workbook(path, rows, args.seed)
+        for result in run_size(path, rows, args.stages, not args.no_memory):
+            throughput = f"{result['rows_per_second']:,.0f}" if result["rows_per_second"] else "-"
+            peak = f"{result['peak_mb']:.1f}" if result["peak_mb"] is not None else "-"
+            print(f"{rows:>8}  {result['stage']:<14}{result['seconds']:>9.3f}{throughput:>12}{peak:>9}")
+            all_results.append(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(all_results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,654 @@
+import os
+import re
+import hashlib
+import pickle
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from io import BytesIO
+from xml.sax.saxutils import escape as xml_escape
+
+import pandas as pd
+import numpy as np
+import openpyxl
+from openpyxl.styles import Font, PatternFill, NamedStyle
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.lib.utils import simpleSplit
+
+from gradebook import COLUMN_ROLES, percentage_columns, format_percent_series, resolve_columns
+
+
+# Excel download function
+EXCEL_FONT = 'Segoe UI'
+EXCEL_HEADER_COLOR = '5B5FC7'
+EXCEL_STRIPE_COLORS = ['E7E7F7', 'FFFFFF']
+EXCEL_MANUAL_WIDTHS = {'A': 30, 'C': 35}
+# Excel sheet names: at most 31 characters, none of []:*?/\, unique case-insensitively
+EXCEL_SHEET_TITLE_LENGTH = 31
+EXCEL_INVALID_SHEET_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+
+def excel_named_styles():
+    header_fill = PatternFill(start_color=EXCEL_HEADER_COLOR, end_color=EXCEL_HEADER_COLOR, fill_type='solid')
+    styles = [
+        NamedStyle(name='gradebook_title', font=Font(name=EXCEL_FONT, size=18, bold=True, color='FFFFFF'), fill=header_fill),
+        NamedStyle(name='gradebook_band', font=Font(name=EXCEL_FONT), fill=header_fill),
+        NamedStyle(name='gradebook_header', font=Font(name=EXCEL_FONT, bold=True, color='FFFFFF'), fill=header_fill),
+    ]
+    for stripe, color in enumerate(EXCEL_STRIPE_COLORS):
+        fill = PatternFill(start_color=color, end_color=color, fill_type='solid')
+        styles.append(NamedStyle(name=f'gradebook_row{stripe}', font=Font(name=EXCEL_FONT), fill=fill))
+        styles.append(NamedStyle(name=f'gradebook_row{stripe}_pct', font=Font(name=EXCEL_FONT), fill=fill, number_format='0.0%'))
+    return styles
+
+
+def excel_column_widths(df):
+    widths = {}
+    for i, column_name in enumerate(df.columns):
+        column_letter = get_column_letter(i + 1)
+        if column_letter in EXCEL_MANUAL_WIDTHS:
+            widths[column_letter] = EXCEL_MANUAL_WIDTHS[column_letter]
+            continue
+        values = df[column_name]
+        value_length = values[values.notna()].astype(str).str.len().max()
+        max_length = max(len(str(column_name)), 0 if pd.isna(value_length) else int(value_length))
+        widths[column_letter] = max_length + 2
+    return widths
+
+
+def excel_sheet_title(name, used_titles):
+    title = EXCEL_INVALID_SHEET_CHARS.sub(' ', str(name)).strip().strip("'") or 'Sheet'
+    title = title[:EXCEL_SHEET_TITLE_LENGTH]
+    candidate = title
+    counter = 2
+    while candidate.lower() in used_titles:
+        suffix = f' ({counter})'
+        candidate = title[:EXCEL_SHEET_TITLE_LENGTH - len(suffix)] + suffix
+        counter += 1
+    used_titles.add(candidate.lower())
+    return candidate
+
+
+def to_excel(df, title, percentage_cols=None, roles=None):
+    return to_excel_sections(df, [('FilteredData', title, None)], percentage_cols)
+
+
+# sections: (sheet name, title, row positions or None for all rows); one sheet per section.
+# output may be any writable file object (e.g. a zip entry); by default a BytesIO is returned.
+# roles is accepted so every builder shares one signature; the sheet layout does not use it.
+def to_excel_sections(df, sections, percentage_cols=None, output=None, roles=None):
+    output = BytesIO() if output is None else output
+    excel_df = df
+    if percentage_cols is None:
+        percentage_cols = percentage_columns(excel_df)
+
+    # Write-only workbook: every row is streamed once with a registered named style
+    workbook = openpyxl.Workbook(write_only=True)
+    for style in excel_named_styles():
+        workbook.add_named_style(style)
+
+    column_widths = excel_column_widths(excel_df)
+    num_cols = len(excel_df.columns)
+    header_values = [str(col) for col in excel_df.columns]
+
+    row_styles = []
+    for stripe in range(len(EXCEL_STRIPE_COLORS)):
+        row_styles.append([
+            f'gradebook_row{stripe}_pct' if col in percentage_cols else f'gradebook_row{stripe}'
+            for col in excel_df.columns
+        ])
+
+    # Columns are converted to Python lists once; NaN/NA become empty cells
+    columns = [
+        excel_df[col].astype(object).where(excel_df[col].notna(), None).tolist()
+        for col in excel_df.columns
+    ]
+    rows = list(zip(*columns))
+
+    used_titles = set()
+    for sheet_name, title, positions in sections:
+        worksheet = workbook.create_sheet(excel_sheet_title(sheet_name, used_titles))
+        for column_letter, width in column_widths.items():
+            worksheet.column_dimensions[column_letter].width = width
+        worksheet.auto_filter.ref = f'A2:{get_column_letter(num_cols)}2'
+
+        def styled_cell(value, style):
+            cell = WriteOnlyCell(worksheet, value=value)
+            cell.style = style
+            return cell
+
+        title_row = [styled_cell(None, 'gradebook_band') for _ in range(num_cols)]
+        if title:
+            title_row[0] = styled_cell(title, 'gradebook_title')
+        worksheet.append(title_row)
+        worksheet.append([styled_cell(value, 'gradebook_header') for value in header_values])
+
+        section_rows = rows if positions is None else [rows[pos] for pos in positions]
+        for row_index, values in enumerate(section_rows):
+            styles = row_styles[row_index % len(row_styles)]
+            worksheet.append([styled_cell(value, style) for value, style in zip(values, styles)])
+
+    workbook.save(output)
+    if output.seekable():
+        output.seek(0)
+    return output
+
+
+# PDF download function
+FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fonts')
+PDF_FONT = 'Segoe UI'
+PDF_FONT_BOLD = 'Segoe UI-Bold'
+PDF_MARGIN = 0.5 * inch
+PDF_STRIPE_COLORS = [colors.white, colors.HexColor('#E7E7F7')]
+# reportlab's default cell leading and paddings (6pt left/right, 3pt top/bottom)
+PDF_CELL_LEADING = 12
+PDF_CELL_HPAD = 12
+PDF_CELL_VPAD = 6
+# Small slack so rounding never pushes an estimated page chunk onto an extra page
+PDF_PAGE_SLACK = 2
+
+
+# Fonts and paragraph styles are registered once per process and shared by all sessions
+_pdf_styles = None
+_pdf_styles_lock = threading.Lock()
+
+
+def pdf_styles():
+    global _pdf_styles
+    if _pdf_styles is not None:
+        return _pdf_styles
+    with _pdf_styles_lock:
+        if _pdf_styles is None:
+            _pdf_styles = _build_pdf_styles()
+    return _pdf_styles
+
+
+def _build_pdf_styles():
+    pdfmetrics.registerFont(TTFont(PDF_FONT, os.path.join(FONTS_DIR, 'segoeuithis.ttf')))
+    pdfmetrics.registerFont(TTFont(PDF_FONT_BOLD, os.path.join(FONTS_DIR, 'segoeuithibd.ttf')))
+
+    sample_styles = getSampleStyleSheet()
+    return {
+        'title': ParagraphStyle(
+            'CustomTitle',
+            fontName=PDF_FONT_BOLD,
+            parent=sample_styles['Heading1'],
+            fontSize=16,
+            spaceAfter=20,
+            alignment=1,
+            textColor=colors.HexColor('#5B5FC7')
+        ),
+        'footer': ParagraphStyle(
+            'Footer',
+            fontName=PDF_FONT,
+            parent=sample_styles['Normal'],
+            fontSize=8,
+            spaceAfter=12,
+            alignment=1,
+            textColor=colors.grey
+        ),
+        'first_col': ParagraphStyle(
+            'FirstColStyle',
+            fontName=PDF_FONT,
+            fontSize=9,
+            alignment=0,
+            leading=11
+        ),
+        'long_col': ParagraphStyle(
+            'LongColStyle',
+            fontName=PDF_FONT,
+            fontSize=8,
+            alignment=0,
+            leading=10
+        ),
+        # Simple paragraph style for all landscape content
+        'content': ParagraphStyle(
+            'ContentStyle',
+            fontName=PDF_FONT,
+            fontSize=10,
+            alignment=0,
+            leading=12
+        ),
+    }
+
+
+def pdf_text_frame(df, percentage_cols):
+    columns = {}
+    for col in df.columns:
+        if col in percentage_cols:
+            text = format_percent_series(df[col], "")
+        else:
+            text = df[col].astype(str).where(df[col].notna(), "")
+        # Removes the combining dot U+0307 that renders 'i' with a double dot
+        columns[col] = text.str.replace('\u0307', '', regex=False)
+    return pd.DataFrame(columns, index=df.index)
+
+
+def pdf_cell_column(values, col_width, body_size, wrap_style):
+    if wrap_style is None:
+        return values.tolist(), np.full(len(values), PDF_CELL_LEADING)
+
+    # Measure each distinct value once; only values wider than the column become Paragraphs
+    avail_width = col_width - PDF_CELL_HPAD
+    wrapped_lines = {}
+    for text in values.unique():
+        if pdfmetrics.stringWidth(text, PDF_FONT, body_size) <= avail_width:
+            wrapped_lines[text] = 0
+        else:
+            lines = simpleSplit(text, wrap_style.fontName, wrap_style.fontSize, avail_width)
+            wrapped_lines[text] = max(len(lines), 1)
+
+    line_counts = values.map(wrapped_lines).to_numpy()
+    heights = np.where(line_counts > 0, line_counts * wrap_style.leading, PDF_CELL_LEADING)
+    cells = [
+        Paragraph(xml_escape(text), wrap_style) if lines else text
+        for text, lines in zip(values.tolist(), line_counts.tolist())
+    ]
+    return cells, heights
+
+
+def pdf_table_chunks(header, rows, row_heights, col_widths, table_style, header_height, first_avail, page_avail):
+    flowables = []
+    cumulative = np.concatenate([[0.0], np.cumsum(row_heights)])
+    start = 0
+    avail = first_avail
+    while True:
+        budget = cumulative[start] + avail - PDF_PAGE_SLACK - header_height
+        end = int(np.searchsorted(cumulative, budget, side='right')) - 1
+        end = min(max(end, start + 1), len(rows))
+        stripes = PDF_STRIPE_COLORS if start % 2 == 0 else PDF_STRIPE_COLORS[::-1]
+        table = Table([header] + rows[start:end], colWidths=col_widths, repeatRows=1)
+        table.setStyle(TableStyle(table_style + [('ROWBACKGROUNDS', (0, 1), (-1, -1), stripes)]))
+        flowables.append(table)
+        if end >= len(rows):
+            return flowables
+        flowables.append(PageBreak())
+        start = end
+        avail = page_avail
+
+
+def build_pdf(df, sections, pagesize, col_widths, wrap_styles, table_style, body_size, percentage_cols=None,
+              text_df=None, output=None):
+    output = BytesIO() if output is None else output
+    doc = SimpleDocTemplate(output, pagesize=pagesize, topMargin=PDF_MARGIN, bottomMargin=PDF_MARGIN,
+                          leftMargin=PDF_MARGIN, rightMargin=PDF_MARGIN)
+
+    try:
+        styles = pdf_styles()
+    except Exception as e:
+        raise RuntimeError(f"PDF fonts could not be loaded from {FONTS_DIR}: {e}") from e
+
+    title_style = styles['title']
+
+    # Frame padding is 6pt on each side
+    page_avail = doc.height - 12
+
+    if text_df is None:
+        if percentage_cols is None:
+            percentage_cols = percentage_columns(df)
+        text_df = pdf_text_frame(df, percentage_cols)
+    pdf_df = text_df
+
+    # Cells and row heights are prepared once for the whole frame and shared by every section
+    headers = [str(col) if col is not None else "" for col in pdf_df.columns]
+    cell_columns = []
+    row_heights = np.full(len(pdf_df), PDF_CELL_LEADING)
+    for i, col in enumerate(pdf_df.columns):
+        wrap_style = styles[wrap_styles[i]] if i in wrap_styles else None
+        cells, heights = pdf_cell_column(pdf_df[col], col_widths[i], body_size, wrap_style)
+        cell_columns.append(cells)
+        row_heights = np.maximum(row_heights, heights)
+    rows = [list(row) for row in zip(*cell_columns)]
+    row_heights = row_heights + PDF_CELL_VPAD
+
+    # Header row: one line plus 3pt top and 12pt bottom padding
+    header_height = PDF_CELL_LEADING + 15
+    table_style = [
+        ('FONTNAME', (0, 0), (-1, 0), PDF_FONT_BOLD),
+        ('FONTNAME', (0, 1), (-1, -1), PDF_FONT),
+    ] + table_style
+    created_at = pd.Timestamp.now().strftime('%d.%m.%Y %H:%M')
+
+    story = []
+    for section_index, (_, title, positions) in enumerate(sections):
+        if section_index:
+            story.append(PageBreak())
+
+        first_avail = page_avail
+        if title:
+            title_text = str(title) if title else ""
+            title_para = Paragraph(title_text, title_style)
+            story.append(title_para)
+            story.append(Spacer(1, 12))
+            first_avail -= title_para.wrap(doc.width, doc.height)[1] + title_style.spaceAfter + 12
+
+        if positions is None:
+            section_rows, section_heights = rows, row_heights
+        else:
+            section_rows, section_heights = [rows[pos] for pos in positions], row_heights[positions]
+        story.extend(pdf_table_chunks(headers, section_rows, section_heights, col_widths, table_style,
+                                      header_height, first_avail, page_avail))
+
+        story.append(Spacer(1, 20))
+        footer_text = f"Nəticələr sayı: {len(section_rows)} | Yaradılma tarixi: {created_at}"
+        footer_para = Paragraph(footer_text, styles['footer'])
+        story.append(footer_para)
+
+    doc.build(story)
+    if output.seekable():
+        output.seek(0)
+    return output
+
+
+# PDF layouts size and wrap columns by role; without a role map the headers are matched
+# against the role keywords (so "E-mail" counts as email just like at ingest)
+LONG_CONTENT_ROLES = ["email", "assignment"]
+SHORT_NUMERIC_ROLES = ["points", "max", "percent"]
+
+
+def column_role_indices(df, roles=None):
+    columns = list(df.columns)
+    if roles is None:
+        keyword_roles = {role: {**spec, "column": None} for role, spec in COLUMN_ROLES.items()}
+        try:
+            return {role: col - 1 for role, col in resolve_columns(columns, keyword_roles).items()}
+        except ValueError:
+            return {}
+    return {role: columns.index(col) for role, col in roles.items() if col in columns}
+
+
+def to_pdf(df, title, percentage_cols=None, roles=None):
+    return to_pdf_sections(df, [(None, title, None)], percentage_cols, roles=roles)
+
+
+# sections: (name, title, row positions or None for all rows); each section starts on a new page.
+# text_df: a pdf_text_frame already built for df, shared when both orientations are exported
+def to_pdf_sections(df, sections, percentage_cols=None, text_df=None, output=None, roles=None):
+    first_col_index = 0
+    long_content_col_indices = []
+    short_content_col_indices = []
+
+    role_indices = column_role_indices(df, roles)
+    long_role_indices = {role_indices[role] for role in LONG_CONTENT_ROLES if role in role_indices}
+    for i in range(len(df.columns)):
+        if i == first_col_index:
+            pass
+        elif i in long_role_indices:
+            long_content_col_indices.append(i)
+        else:
+            short_content_col_indices.append(i)
+
+    wrap_styles = {first_col_index: 'first_col'}
+    for i in long_content_col_indices:
+        wrap_styles[i] = 'long_col'
+
+    page_width = A4[0] - 2 * PDF_MARGIN
+    num_cols = len(df.columns)
+
+    col_widths = [0] * num_cols
+
+    first_col_width = 1.5 * inch
+    col_widths[first_col_index] = first_col_width
+
+    long_col_width = 1.2 * inch
+    for i in long_content_col_indices:
+        col_widths[i] = long_col_width
+
+    total_assigned_width = first_col_width + (len(long_content_col_indices) * long_col_width)
+    remaining_width = page_width - total_assigned_width
+
+    num_short_cols = len(short_content_col_indices)
+    if num_short_cols > 0:
+        short_col_width = remaining_width / num_short_cols
+        for i in short_content_col_indices:
+            col_widths[i] = short_col_width
+
+    table_style = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#5B5FC7')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('ALIGN', (first_col_index, 1), (first_col_index, -1), 'LEFT'),
+        ('VALIGN', (first_col_index, 1), (first_col_index, -1), 'TOP'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]
+
+    for col_index in long_content_col_indices:
+        table_style.append(('ALIGN', (col_index, 1), (col_index, -1), 'LEFT'))
+        table_style.append(('VALIGN', (col_index, 1), (col_index, -1), 'TOP'))
+
+    for col_index in short_content_col_indices:
+        table_style.append(('ALIGN', (col_index, 1), (col_index, -1), 'CENTER'))
+        table_style.append(('VALIGN', (col_index, 1), (col_index, -1), 'MIDDLE'))
+
+    return build_pdf(df, sections, A4, col_widths, wrap_styles, table_style,
+                     body_size=9, percentage_cols=percentage_cols, text_df=text_df, output=output)
+
+
+def to_pdf_landscape(df, title, percentage_cols=None, roles=None):
+    return to_pdf_landscape_sections(df, [(None, title, None)], percentage_cols, roles=roles)
+
+
+def to_pdf_landscape_sections(df, sections, percentage_cols=None, text_df=None, output=None, roles=None):
+    # Use landscape orientation - swap width and height of A4
+    pagesize = (A4[1], A4[0])
+
+    # Any cell too wide for its column is wrapped in a paragraph
+    wrap_styles = {i: 'content' for i in range(len(df.columns))}
+
+    # Calculate page width for landscape (A4 height becomes width)
+    page_width = A4[1] - 2 * PDF_MARGIN
+    num_cols = len(df.columns)
+
+    # Smart column width distribution for landscape
+    col_widths = [0] * num_cols
+
+    # Identify column types based on names and content
+    first_col_index = 0         # First column (likely full names) - needs extra width
+    short_numeric_cols = []     # Points, Max Points, Percent - these need less width
+    long_content_cols = []      # Columns with longer text content
+    regular_cols = []           # Everything else
+
+    role_indices = column_role_indices(df, roles)
+    short_role_indices = {role_indices[role] for role in SHORT_NUMERIC_ROLES if role in role_indices}
+    long_role_indices = {role_indices[role] for role in LONG_CONTENT_ROLES if role in role_indices}
+
+    for i in range(num_cols):
+        if i == first_col_index:
+            # First column handled separately
+            continue
+        elif i in short_role_indices:
+            short_numeric_cols.append(i)
+        elif i == 2 or i in long_role_indices:
+            # Third column (index 2) or columns with typically longer content
+            long_content_cols.append(i)
+        else:
+            regular_cols.append(i)
+
+    # Allocate widths: first column gets extra width, short numeric cols get less, long content cols get more
+    first_col_width = 1.8 * inch      # Extra width for full names
+    short_col_width = 0.8 * inch      # Narrow columns for numeric data
+    regular_col_width = 1.2 * inch    # Regular width
+
+    # Calculate remaining width for long content columns
+    used_width = (first_col_width +
+                 len(short_numeric_cols) * short_col_width +
+                 len(regular_cols) * regular_col_width)
+    remaining_width = page_width - used_width
+
+    if len(long_content_cols) > 0:
+        long_col_width = remaining_width / len(long_content_cols)
+    else:
+        long_col_width = regular_col_width
+
+    # Assign widths
+    for i in range(num_cols):
+        if i == first_col_index:
+            col_widths[i] = first_col_width
+        elif i in short_numeric_cols:
+            col_widths[i] = short_col_width
+        elif i in long_content_cols:
+            col_widths[i] = long_col_width
+        else:
+            col_widths[i] = regular_col_width
+
+    table_style = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#5B5FC7')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('FONTSIZE', (0, 1), (-1, -1), 10),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]
+
+    # Apply left alignment and top valignment for long content columns and first column
+    for col_index in long_content_cols:
+        table_style.append(('ALIGN', (col_index, 1), (col_index, -1), 'LEFT'))
+        table_style.append(('VALIGN', (col_index, 1), (col_index, -1), 'TOP'))
+
+    # First column (names) should also be left-aligned and top-aligned
+    table_style.append(('ALIGN', (first_col_index, 1), (first_col_index, -1), 'LEFT'))
+    table_style.append(('VALIGN', (first_col_index, 1), (first_col_index, -1), 'TOP'))
+
+    return build_pdf(df, sections, pagesize, col_widths, wrap_styles, table_style,
+                     body_size=10, percentage_cols=percentage_cols, text_df=text_df, output=output)
+
+
+# Fingerprint used to memoize built exports per frame content
+def frame_fingerprint(df):
+    hasher = hashlib.sha256()
+    hasher.update(repr(list(df.columns)).encode("utf-8"))
+    hasher.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return hasher.hexdigest()
+
+
+EXPORT_BUILDERS = {
+    "excel": to_excel,
+    "pdf": to_pdf,
+    "pdf_landscape": to_pdf_landscape,
+}
+
+# Split-by-assignment variants: one sheet / PDF section per assignment from a single frame
+SECTION_BUILDERS = {
+    "excel": to_excel_sections,
+    "pdf": to_pdf_sections,
+    "pdf_landscape": to_pdf_landscape_sections,
+}
+
+
+# "Download all": every format in one zip, built from one shared preparation of the frame.
+# Each file is written straight into its archive entry, so no format is held as a separate copy.
+def to_zip_bundle(df, sections, filenames, percentage_cols=None, formats=None, roles=None):
+    output = BytesIO()
+    if percentage_cols is None:
+        percentage_cols = percentage_columns(df)
+    # Both PDFs read the same text frame (percent formatting and the U+0307 cleanup run once)
+    text_df = pdf_text_frame(df, percentage_cols)
+    created_at = time.localtime()[:6]
+
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as bundle:
+        for export_format in formats or SECTION_BUILDERS:
+            entry_info = zipfile.ZipInfo(filenames[export_format], date_time=created_at)
+            # .xlsx is already a zip archive; deflating it again only costs time
+            entry_info.compress_type = zipfile.ZIP_STORED if export_format == "excel" else zipfile.ZIP_DEFLATED
+            with bundle.open(entry_info, "w") as entry:
+                if export_format == "excel":
+                    to_excel_sections(df, sections, percentage_cols, output=entry, roles=roles)
+                else:
+                    SECTION_BUILDERS[export_format](df, sections, percentage_cols, text_df=text_df, output=entry,
+                                                    roles=roles)
+
+    output.seek(0)
+    return output
+
+
+# Export scheduling for batch.py: format builders are CPU-bound and hold the GIL, so they run in
+# worker processes. The app builds one file per click and keeps its builds in the request thread.
+def export_worker_count(requested=None):
+    if requested:
+        return max(1, int(requested))
+    configured = os.environ.get("GRADES_EXPORT_WORKERS")
+    if configured:
+        return max(1, int(configured))
+    return os.cpu_count() or 1
+
+
+def build_export_bytes(export_format, frame_payload, title, percentage_cols=None, sections=None, roles=None):
+    started = time.perf_counter()
+    if isinstance(frame_payload, tuple):
+        frame_bytes, buffers = frame_payload
+        df = pickle.loads(frame_bytes, buffers=buffers)
+    else:
+        df = frame_payload
+    if sections is None:
+        data = EXPORT_BUILDERS[export_format](df, title, percentage_cols, roles=roles).getvalue()
+    else:
+        data = SECTION_BUILDERS[export_format](df, sections, percentage_cols, roles=roles).getvalue()
+    return data, time.perf_counter() - started
+
+
+class ExportScheduler:
+    def __init__(self, max_workers=None):
+        self.max_workers = export_worker_count(max_workers)
+        self._pool = ProcessPoolExecutor(self.max_workers) if self.max_workers > 1 else None
+        self._payloads = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+        self._payloads.clear()
+
+    # Each frame is serialized once per scheduler with protocol 5: the column arrays are taken
+    # out-of-band as raw buffers, so the pickle stream only holds the frame's structure and the
+    # executor passes the array memory to each task as plain bytes instead of re-encoding it
+    def _payload(self, df):
+        key = id(df)
+        if key not in self._payloads:
+            buffers = []
+            frame_bytes = pickle.dumps(df, protocol=5, buffer_callback=buffers.append)
+            self._payloads[key] = (df, (frame_bytes, [buffer.raw().tobytes() for buffer in buffers]))
+        return self._payloads[key][1]
+
+    def release(self, df):
+        self._payloads.pop(id(df), None)
+
+    def submit(self, export_format, df, title, percentage_cols=None, sections=None, roles=None):
+        if self._pool is None:
+            future = Future()
+            try:
+                future.set_result(build_export_bytes(export_format, df, title, percentage_cols, sections, roles))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self._pool.submit(build_export_bytes, export_format, self._payload(df), title,
+                                 percentage_cols, sections, roles)
+
+    def submit_task(self, fn, *args, **kwargs):
+        if self._pool is None:
+            future = Future()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self._pool.submit(fn, *args, **kwargs)
@@ -0,0 +1,464 @@
+import re
+
+import pandas as pd
+import numpy as np
+import openpyxl
+from operator import itemgetter
+
+from profiling import stage
+
+
+# Gradebook layout: title cell, header row, then one result per row
+TITLE_CELL = "D1"
+HEADER_ROW = 2
+
+# Column roles in output order. A role keeps its column in the standard LMS export when that
+# header matches its keywords; otherwise the first unused matching header wins, and with no
+# match at all the standard column is used as-is.
+COLUMN_ROLES = {
+    "name": {"keywords": ["full name", "student name", "ad soyad"], "column": 4},
+    "email": {"keywords": ["email", "e-mail"], "column": 7},
+    "assignment": {"keywords": ["assignment"], "column": 8},
+    "points": {"keywords": ["point", "score"], "exclude": ["max"], "column": 13},
+    "max": {"keywords": ["max"], "column": 14},
+    "percent": {"keywords": ["percent", "%"], "column": 15},
+}
+# Subject filter: rows are kept when the assignment matches any keyword (case-insensitive)
+DEFAULT_SUBJECT_KEYWORDS = ["riyaziyyat"]
+
+# "Max Points" also contains "point", so max is claimed before points
+ROLE_RESOLUTION_ORDER = ["max", "percent", "email", "assignment", "points", "name"]
+
+
+def resolve_columns(header_row, column_roles=None):
+    column_roles = column_roles or COLUMN_ROLES
+    lowered = [str(header).strip().lower() if header is not None else "" for header in header_row]
+
+    order = [role for role in ROLE_RESOLUTION_ORDER if role in column_roles]
+    order += [role for role in column_roles if role not in order]
+
+    resolved = {}
+    used = set()
+    for role in order:
+        spec = column_roles[role]
+        keywords = [keyword.lower() for keyword in spec.get("keywords", [])]
+        excludes = [word.lower() for word in spec.get("exclude", [])]
+        candidates = [
+            i + 1 for i, header in enumerate(lowered)
+            if i + 1 not in used and any(keyword in header for keyword in keywords)
+            and not any(word in header for word in excludes)
+        ]
+        fallback = spec.get("column")
+        if fallback in candidates or (not candidates and fallback is not None and fallback not in used):
+            resolved[role] = fallback
+        elif candidates:
+            resolved[role] = candidates[0]
+        else:
+            continue
+        used.add(resolved[role])
+
+    if not resolved:
+        raise ValueError("Gradebook columns could not be resolved from the header row")
+    return {role: resolved[role] for role in column_roles if role in resolved}
+
+
+# Keywords are escaped into one alternation; a regex is used as given. None keeps every row.
+def compile_subject_filter(keywords=None, regex=None):
+    if regex:
+        return re.compile(regex, re.IGNORECASE)
+    keywords = [str(keyword).strip() for keyword in (keywords or []) if str(keyword).strip()]
+    if not keywords:
+        return None
+    return re.compile("|".join(re.escape(keyword) for keyword in keywords), re.IGNORECASE)
+
+
+def subject_filter_counts(df, assignments_col, keywords=None, regex=None):
+    if assignments_col is None or df.empty:
+        return {}
+    # Object dtype keeps Python's re semantics (as in the ingest filter), so "İ" matches "i"
+    values = df[assignments_col].astype(object)
+    if regex:
+        return {regex: int(values.str.contains(regex, case=False, regex=True, na=False).sum())}
+    return {
+        keyword: int(values.str.contains(re.escape(keyword), case=False, regex=True, na=False).sum())
+        for keyword in keywords or []
+    }
+
+
+DEFAULT_SUBJECT_FILTER = compile_subject_filter(DEFAULT_SUBJECT_KEYWORDS)
+
+
+# Other sheets of a workbook are read only when their headers name at least two roles
+MIN_SHEET_ROLE_MATCHES = 2
+
+
+def header_role_matches(header_row, column_roles=None):
+    column_roles = column_roles or COLUMN_ROLES
+    lowered = [str(header).strip().lower() for header in header_row if header is not None]
+    return sum(
+        any(keyword.lower() in header for header in lowered for keyword in spec.get("keywords", []))
+        for spec in column_roles.values()
+    )
+
+
+# Gradebook ingestion: the active sheet, or with all_sheets every sheet laid out as a gradebook
+def read_gradebook(source, column_roles=None, title_coordinate=TITLE_CELL, subject_filter=DEFAULT_SUBJECT_FILTER,
+                   all_sheets=False):
+    with stage("open workbook"):
+        wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+
+    try:
+        active = wb.active
+        parsed = [read_worksheet(active, column_roles, title_coordinate, subject_filter)]
+        if all_sheets:
+            for ws in wb.worksheets:
+                if ws is not active:
+                    sheet = read_worksheet(ws, column_roles, title_coordinate, subject_filter, require_match=True)
+                    if sheet is not None:
+                        parsed.append(sheet)
+    finally:
+        wb.close()
+
+    return parsed[0] if len(parsed) == 1 else merge_gradebooks(parsed)
+
+
+# The header row is read once and resolved into column roles
+def read_worksheet(ws, column_roles=None, title_coordinate=TITLE_CELL, subject_filter=DEFAULT_SUBJECT_FILTER,
+                   require_match=False):
+    # LMS exports often carry a stale <dimension> tag; stream until the real end
+    ws.reset_dimensions()
+
+    title_col_letter, title_row_number = openpyxl.utils.cell.coordinate_from_string(title_coordinate)
+    title_col = openpyxl.utils.column_index_from_string(title_col_letter)
+
+    top_rows = list(ws.iter_rows(min_row=1, max_row=max(HEADER_ROW, title_row_number), values_only=True))
+    header_row = top_rows[HEADER_ROW - 1] if len(top_rows) >= HEADER_ROW else ()
+    title_values = top_rows[title_row_number - 1] if len(top_rows) >= title_row_number else ()
+    title_cell = title_values[title_col - 1] if len(title_values) >= title_col else None
+
+    if require_match and header_role_matches(header_row, column_roles) < MIN_SHEET_ROLE_MATCHES:
+        return None
+
+    role_columns = resolve_columns(header_row, column_roles)
+    cols_to_copy = list(role_columns.values())
+
+    # Only the span of resolved columns is streamed
+    min_col = min(cols_to_copy)
+    max_col = max(cols_to_copy)
+    offsets = [col - min_col for col in cols_to_copy]
+    pick_cols = itemgetter(*offsets) if len(offsets) > 1 else (lambda row: (row[offsets[0]],))
+
+    padded_header = tuple(header_row) + (None,) * max(0, max_col - len(header_row))
+    raw_headers = [padded_header[col - 1] for col in cols_to_copy]
+
+    selected_headers = []
+    for i, header in enumerate(raw_headers):
+        if header is None or header == "":
+            col_letter = openpyxl.utils.get_column_letter(cols_to_copy[i])
+            unique_header = f"Column_{col_letter}"
+        else:
+            unique_header = str(header).strip()
+
+        original_header = unique_header
+        counter = 1
+        while unique_header in selected_headers:
+            unique_header = f"{original_header}_{counter}"
+            counter += 1
+
+        selected_headers.append(unique_header)
+
+    roles = {role: selected_headers[i] for i, role in enumerate(role_columns)}
+    assignments_col_index = list(role_columns).index("assignment") if "assignment" in role_columns else None
+    if subject_filter is None:
+        assignments_col_index = None
+    else:
+        subject_search = subject_filter.search
+
+    data = []
+    total_rows_count = 0
+
+    # Rows are streamed as value tuples; non-matching rows are dropped immediately
+    with stage("row loop"):
+        for row_values in ws.iter_rows(min_row=HEADER_ROW + 1, min_col=min_col, max_col=max_col, values_only=True):
+            total_rows_count += 1
+            row_values = pick_cols(row_values)
+
+            if assignments_col_index is not None:
+                assignments_value = row_values[assignments_col_index]
+                if assignments_value and isinstance(assignments_value, str):
+                    if subject_search(assignments_value):
+                        data.append(row_values)
+            # Without a filter, trailing formatted-but-empty rows would otherwise be kept
+            elif any(value is not None for value in row_values):
+                data.append(row_values)
+
+    with stage("build frame"):
+        df = compact_frame(pd.DataFrame(data, columns=selected_headers), roles)
+        filtered_rows_count = len(data)
+        # Classified once per upload; row subsets keep the same percentage columns
+        percentage_cols = percentage_columns(df)
+
+    return title_cell, selected_headers, df, total_rows_count, filtered_rows_count, percentage_cols, roles
+
+
+# Several sheets/files are aligned on the first one's column roles and concatenated once
+def merge_gradebooks(parsed_list):
+    if len(parsed_list) == 1:
+        return parsed_list[0]
+    title_cell, selected_headers, _, _, _, _, roles = parsed_list[0]
+
+    with stage("merge"):
+        frames = []
+        for _, _, part_df, _, _, _, part_roles in parsed_list:
+            renamed = {part_roles[role]: roles[role] for role in roles if role in part_roles}
+            # Columns without a role line up by header name
+            renamed.update({
+                header: header for header in part_df.columns
+                if header in selected_headers and header not in renamed and header not in renamed.values()
+            })
+            frames.append(part_df[list(renamed)].rename(columns=renamed).reindex(columns=selected_headers))
+        # Categoricals with different categories concatenate as plain values, so compact again
+        df = compact_frame(pd.concat(frames, ignore_index=True), roles)
+
+    total_rows_count = sum(parsed[3] for parsed in parsed_list)
+    filtered_rows_count = len(df)
+    percentage_cols = percentage_columns(df)
+    return title_cell, selected_headers, df, total_rows_count, filtered_rows_count, percentage_cols, roles
+
+
+# Re-uploads: rows are identified by a hash of their values, so a newer export of the same
+# gradebook keeps the index labels of every row that did not change
+FINGERPRINT_MISSING = "\x00"
+
+
+def row_fingerprints(df):
+    # Values are normalised first: compact_frame picks dtypes per upload, and one late 7.5 or
+    # "abs" turns an Int8 column into float64 or object. Numbers hash as their float64 text,
+    # categories as their values and every kind of missing value alike.
+    columns = {}
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            normalized = values.astype("float64").astype(object)
+        elif values.dtype == object:
+            numbers = pd.to_numeric(values, errors="coerce").astype("float64")
+            normalized = values.where(numbers.isna(), numbers.astype(object))
+        else:
+            normalized = values.astype(object)
+        columns[col] = normalized.where(values.notna(), FINGERPRINT_MISSING).astype(str)
+    return pd.util.hash_pandas_object(pd.DataFrame(columns, index=df.index), index=False)
+
+
+# Identical rows are told apart by their occurrence number
+def occurrence_keys(fingerprints):
+    values = fingerprints.to_numpy()
+    return pd.MultiIndex.from_arrays([values, fingerprints.groupby(values).cumcount().to_numpy()])
+
+
+# previous_keys/keys: occurrence keys already computed for the frames, so a kept upload is not rehashed
+def relabel_upload(previous_df, df, identity_cols=None, previous_keys=None, keys=None):
+    if previous_keys is None:
+        previous_keys = occurrence_keys(row_fingerprints(previous_df))
+    if keys is None:
+        keys = occurrence_keys(row_fingerprints(df))
+
+    labels = pd.Series(previous_df.index, index=previous_keys).reindex(keys).to_numpy(dtype="float64", copy=True)
+    added_mask = np.isnan(labels)
+    removed_mask = ~previous_keys.isin(keys)
+
+    # New rows are numbered after every label the previous upload used
+    next_label = int(previous_df.index.max()) + 1 if len(previous_df) else 0
+    labels[added_mask] = np.arange(next_label, next_label + added_mask.sum())
+    relabeled = df.set_axis(pd.Index(labels.astype("int64")))
+
+    # A row whose identity (email + assignment) is both removed and added counts as changed
+    changed = 0
+    if identity_cols and added_mask.any() and removed_mask.any():
+        # Retakes repeat an identity, so each one counts min(added, removed) changed rows
+        removed_counts = previous_df.loc[removed_mask, identity_cols].astype(object).value_counts(dropna=False)
+        added_counts = df.loc[added_mask, identity_cols].astype(object).value_counts(dropna=False)
+        changed = int(pd.concat([added_counts, removed_counts], axis=1, join="inner").min(axis=1).sum())
+
+    changes = {
+        "added": int(added_mask.sum()) - changed,
+        "changed": changed,
+        "removed": int(removed_mask.sum()) - changed,
+    }
+    return relabeled, changes
+
+
+# Repeated text becomes categorical and whole-number scores become nullable small integers;
+# percentages stay float64 so exported values are unchanged
+CATEGORICAL_ROLES = ["email", "assignment"]
+INTEGER_ROLES = ["points", "max"]
+INTEGER_DTYPES = ["Int8", "Int16", "Int32", "Int64"]
+
+
+def compact_integers(series):
+    numeric = pd.to_numeric(series, errors="coerce")
+    # Text such as "abs" in a score column keeps the column as it is
+    if numeric.isna().ne(series.isna()).any():
+        return None
+    values = numeric.dropna()
+    if values.empty or not (values == values.round()).all():
+        return None
+    low, high = values.min(), values.max()
+    for dtype in INTEGER_DTYPES:
+        info = np.iinfo(dtype.lower())
+        if info.min <= low and high <= info.max:
+            return numeric.astype(dtype)
+    return None
+
+
+def compact_frame(df, roles):
+    columns = {}
+    for role in CATEGORICAL_ROLES:
+        col = roles.get(role)
+        if col is not None:
+            columns[col] = df[col].astype("category")
+    for role in INTEGER_ROLES:
+        col = roles.get(role)
+        if col is not None:
+            compacted = compact_integers(df[col])
+            if compacted is not None:
+                columns[col] = compacted
+    return df.assign(**columns) if columns else df
+
+
+# Duplicates are ranked by Percent when present, otherwise by Points
+def score_column(roles):
+    return roles.get("percent") or roles.get("points")
+
+
+# Columns whose values all lie in [0, 1] are shown as percentages everywhere
+NUMERIC_DTYPES = ['float64', 'float32', 'int64', 'int32', 'Float64', 'Float32'] + INTEGER_DTYPES
+
+
+def percentage_columns(df):
+    numeric_df = df.select_dtypes(include=NUMERIC_DTYPES)
+    if numeric_df.empty:
+        return []
+    counts = numeric_df.count()
+    mins = numeric_df.min()
+    maxs = numeric_df.max()
+    is_percentage = (counts > 0) & (mins >= 0) & (maxs <= 1)
+    return list(is_percentage[is_percentage].index)
+
+
+def format_percent_series(series, na_rep=None):
+    # Compact Int8 columns of 0/1 would otherwise print as "100%" rather than "100.0%"
+    formatted = series.astype("float64").mul(100).round(1).astype(str) + "%"
+    return formatted.where(series.notna(), na_rep)
+
+
+def format_percentages(df, percentage_cols, na_rep=None):
+    if not percentage_cols:
+        return df
+    return df.assign(**{col: format_percent_series(df[col], na_rep) for col in percentage_cols})
+
+
+# Built once per upload: assignment -> row positions, in option (sorted) order
+def assignment_index(df, assignments_col):
+    values = df[assignments_col]
+    labels = values.astype(str).to_numpy(dtype=object)
+    valid = np.flatnonzero(values.notna().to_numpy() & (labels != ""))
+    groups = pd.Series(valid).groupby(labels[valid]).indices
+    return {label: valid[groups[label]] for label in sorted(groups)}
+
+
+def assignment_options(df, assignments_col, index=None):
+    if index is not None:
+        return list(index)
+    assignments_series = df[assignments_col].dropna()
+    assignments_series = assignments_series[assignments_series != ""]
+    return sorted(assignments_series.astype(str).unique())
+
+
+def select_assignments(df, assignments_col, selected_assignments, index=None):
+    if not selected_assignments:
+        return df
+    if index is not None:
+        # Positions are merged in file order so the result matches a boolean-mask selection
+        positions = [index[assignment] for assignment in selected_assignments if assignment in index]
+        return df.iloc[np.sort(np.concatenate(positions))] if positions else df.iloc[:0]
+    return df[df[assignments_col].astype(str).isin(selected_assignments)]
+
+
+# Split exports: one groupby gives the row positions of every selected assignment
+def assignment_sections(df, assignments_col, selected_assignments):
+    positions = df.groupby(df[assignments_col].astype(str), sort=False).indices
+    return [
+        (assignment, positions[assignment])
+        for assignment in selected_assignments
+        if assignment in positions
+    ]
+
+
+# Automatic duplicate-resolution policies; manual picks are applied on top
+DUPLICATE_POLICIES = {
+    "manual": "Əl ilə seç",
+    "best": "Ən yüksək nəticə",
+    "last": "Son cəhd",
+    "first": "İlk cəhd",
+}
+
+
+# Split exports judge duplicates per assignment, so keys become (email, assignment)
+def duplicate_key(email_col, group_col=None):
+    return email_col if group_col is None else [email_col, group_col]
+
+
+def resolve_duplicates(df, email_col, policy, score_col=None, group_col=None):
+    key = duplicate_key(email_col, group_col)
+    duplicated_df = df[df.duplicated(subset=key, keep=False)]
+    if policy == "manual" or duplicated_df.empty:
+        return {}
+
+    if policy == "best" and score_col is not None:
+        scores = pd.to_numeric(duplicated_df[score_col], errors="coerce").astype("float64").fillna(-np.inf)
+        key_cols = [email_col] if group_col is None else key
+        kept_idx = scores.groupby([duplicated_df[col] for col in key_cols], sort=False, observed=True).idxmax()
+        return dict(zip(kept_idx.index, kept_idx.tolist()))
+
+    keep = "first" if policy == "first" else "last"
+    kept = duplicated_df.drop_duplicates(subset=key, keep=keep)
+    return dict(zip(kept.set_index(key).index, kept.index))
+
+
+def drop_unselected_duplicates(df, email_col, selection, group_col=None):
+    duplicates_mask = df.duplicated(subset=duplicate_key(email_col, group_col), keep=False)
+    return df[~duplicates_mask | df.index.isin(list(selection.values()))]
+
+
+# Output naming: first five characters of the upload + first assignment up to "variant"
+def trim_until_variant(s):
+    lower_s = s.lower()
+    idx = lower_s.find("variant")
+    if idx != -1:
+        return s[:idx]
+    else:
+        return s
+
+
+def export_filter_part(selected_assignments):
+    if selected_assignments:
+        return trim_until_variant(str(selected_assignments[0]))
+    return "unfiltered"
+
+
+def export_filenames(original_filename, filter_part):
+    trimmed_year = original_filename[:5]
+    return {
+        "excel": f"{trimmed_year}{filter_part}.xlsx",
+        "pdf": f"{trimmed_year}{filter_part}_dik.pdf",
+        "pdf_landscape": f"{trimmed_year}{filter_part}.pdf",
+        "zip": f"{trimmed_year}{filter_part}.zip",
+    }
+
+
+def export_title(title_cell, filter_part):
+    return str(title_cell or "")[:-15] + filter_part
+
+
+def section_title(title_cell, assignment):
+    return export_title(title_cell, str(assignment))
@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import tempfile
+from io import BytesIO
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from gradebook import TITLE_CELL, COLUMN_ROLES, DEFAULT_SUBJECT_FILTER, read_gradebook
+
+
+# Parsed gradebooks are stored as Parquet, keyed by the upload's SHA-256 and the parse settings
+CACHE_DIR = os.environ.get("GRADES_CACHE_DIR", os.path.join(".cache", "gradebooks"))
+CACHE_MAX_BYTES = int(float(os.environ.get("GRADES_CACHE_MAX_MB", "512")) * 1024 * 1024)
+# Bump when the parsed layout changes so stale entries are never read
+CACHE_VERSION = 2
+CACHE_METADATA_KEY = b"gradebook"
+
+
+def cache_key(file_hash, column_roles=None, title_coordinate=TITLE_CELL, subject_filter=DEFAULT_SUBJECT_FILTER,
+              all_sheets=False):
+    config = {
+        "version": CACHE_VERSION,
+        "column_roles": column_roles or COLUMN_ROLES,
+        "title_cell": title_coordinate,
+        "subject_filter": None if subject_filter is None else [subject_filter.pattern, subject_filter.flags],
+        "all_sheets": all_sheets,
+    }
+    config_digest = hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"{file_hash}-{config_digest[:16]}"
+
+
+def cache_path(key, cache_dir=None):
+    return os.path.join(CACHE_DIR if cache_dir is None else cache_dir, f"{key}.parquet")
+
+
+def load_cached(key, cache_dir=None):
+    path = cache_path(key, cache_dir)
+    try:
+        table = pq.read_table(path)
+        meta = json.loads(table.schema.metadata[CACHE_METADATA_KEY])
+        df = table.to_pandas()
+        # Hits refresh the mtime, which is what eviction orders by
+        os.utime(path)
+    except Exception:
+        return None
+    return (meta["title_cell"], meta["selected_headers"], df, meta["total_rows_count"],
+            meta["filtered_rows_count"], meta["percentage_cols"], meta["roles"])
+
+
+def store_cached(key, parsed, cache_dir=None):
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    title_cell, selected_headers, df, total_rows_count, filtered_rows_count, percentage_cols, roles = parsed
+    temp_path = None
+    try:
+        meta = json.dumps({
+            "title_cell": title_cell,
+            "selected_headers": selected_headers,
+            "total_rows_count": total_rows_count,
+            "filtered_rows_count": filtered_rows_count,
+            "percentage_cols": percentage_cols,
+            "roles": roles,
+        }).encode("utf-8")
+        table = pa.Table.from_pandas(df)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), CACHE_METADATA_KEY: meta})
+
+        # Written to a temp file and renamed so readers never see a partial entry
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pq.write_table(table, f)
+        os.replace(temp_path, cache_path(key, cache_dir))
+        temp_path = None
+    except Exception:
+        # Mixed-type columns or an unwritable directory only cost the cache, never the upload
+        return False
+    finally:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    evict_cache(cache_dir)
+    return True
+
+
+def evict_cache(cache_dir=None, max_bytes=None):
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".parquet"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+
+
+# Drop-in for read_gradebook: accepts a path or bytes and parses only on a cache miss.
+# An empty cache_dir (or GRADES_CACHE_DIR="") disables the cache.
+def read_gradebook_cached(source, file_hash=None, column_roles=None, title_coordinate=TITLE_CELL,
+                          subject_filter=DEFAULT_SUBJECT_FILTER, cache_dir=None, all_sheets=False):
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    if not cache_dir:
+        return read_gradebook(BytesIO(source) if isinstance(source, bytes) else source,
+                              column_roles, title_coordinate, subject_filter, all_sheets)
+
+    if isinstance(source, bytes):
+        file_bytes = source
+    else:
+        with open(source, "rb") as f:
+            file_bytes = f.read()
+    if file_hash is None:
+        file_hash = hashlib.sha256(file_bytes).hexdigest()
+
+    key = cache_key(file_hash, column_roles, title_coordinate, subject_filter, all_sheets)
+    cached = load_cached(key, cache_dir)
+    if cached is not None:
+        return cached
+
+    parsed = read_gradebook(BytesIO(file_bytes), column_roles, title_coordinate, subject_filter, all_sheets)
+    store_cached(key, parsed, cache_dir)
+    return parsed
@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import tracemalloc
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+
+# Opt-in diagnostics: ?debug=1 (or GRADES_DEBUG=1) times each stage of a rerun,
+# ?debug=memory also records tracemalloc peaks (several times slower, so never on by default)
+DEBUG_ENV = "GRADES_DEBUG"
+DEBUG_JSON_ENV = "GRADES_DEBUG_JSON"
+
+logger = logging.getLogger("gradebook.profile")
+
+_active_profile = contextvars.ContextVar("gradebook_profile", default=None)
+# Child records of the open stages, per context: parses running on threads in copied contexts
+# collect their own nested stages and never interleave with each other
+_open_stages = contextvars.ContextVar("gradebook_profile_stages", default=())
+
+# Runs that end in st.stop() or an uncaught exception never reach finish(), and the next run may be
+# on another script thread where _active_profile is unset, so started profiles are also tracked here
+_unfinished_profiles = set()
+_unfinished_lock = threading.Lock()
+
+# Download buttons build their files outside the rerun, so those timings are kept per process
+recent_exports = deque(maxlen=20)
+
+
+def debug_mode(query_value=None):
+    value = str(query_value or os.environ.get(DEBUG_ENV, "")).strip().lower()
+    if value in ("memory", "mem"):
+        return "memory"
+    if value in ("1", "true", "yes", "on", "time"):
+        return "time"
+    return None
+
+
+def json_logging_enabled():
+    return os.environ.get(DEBUG_JSON_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def emit_json(record):
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+class Profile:
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.records = []
+        self._lock = threading.Lock()
+        self._token = None
+        self._started_tracing = False
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._token = _active_profile.set(self)
+        self._thread = threading.current_thread()
+        with _unfinished_lock:
+            _unfinished_profiles.add(self)
+        self.started = time.perf_counter()
+        self._lap_started = self.started
+        self._lap_first_record = 0
+        self._lap_memory = self._traced_current()
+        self._carry = 0
+        return self
+
+    def finish(self, **context):
+        self.total_seconds = time.perf_counter() - self.started
+        with _unfinished_lock:
+            _unfinished_profiles.discard(self)
+        if self._token is not None:
+            # A stale profile closed from a later run's thread has nothing to reset there
+            if _active_profile.get() is self:
+                _active_profile.reset(self._token)
+            self._token = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        if json_logging_enabled():
+            emit_json({"event": "rerun", "total_seconds": self.total_seconds, "stages": self.records, **context})
+        return self
+
+    def _traced_current(self):
+        return tracemalloc.get_traced_memory()[0] if self.trace_memory and tracemalloc.is_tracing() else 0
+
+    @staticmethod
+    def _make_record(name, seconds, depth, peak_bytes=None):
+        record = {"stage": name, "depth": depth, "seconds": seconds}
+        if peak_bytes is not None:
+            record["peak_mb"] = max(peak_bytes, 0) / 1024 / 1024
+        return record
+
+    def _record(self, name, seconds, depth, peak_bytes=None, index=None):
+        record = self._make_record(name, seconds, depth, peak_bytes)
+        if index is None:
+            self.records.append(record)
+        else:
+            self.records.insert(index, record)
+
+    # Laps time the top-level script between checkpoints; nested stages are listed under them
+    def lap(self, name):
+        now = time.perf_counter()
+        peak_bytes = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            peak_bytes = max(peak, self._carry) - self._lap_memory
+            tracemalloc.reset_peak()
+            self._lap_memory = current
+            self._carry = 0
+        self._record(name, now - self._lap_started, 0, peak_bytes, index=self._lap_first_record)
+        self._lap_started = now
+        self._lap_first_record = len(self.records)
+
+    @contextmanager
+    def stage(self, name):
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        start_memory = 0
+        parent_carry = self._carry
+        if tracing:
+            start_memory, peak = tracemalloc.get_traced_memory()
+            parent_carry = max(parent_carry, peak)
+            tracemalloc.reset_peak()
+            self._carry = 0
+        open_stages = _open_stages.get()
+        children = []
+        stages_token = _open_stages.set(open_stages + (children,))
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            _open_stages.reset(stages_token)
+            peak_bytes = None
+            if tracing:
+                stage_peak = max(tracemalloc.get_traced_memory()[1], self._carry)
+                peak_bytes = stage_peak - start_memory
+                self._carry = max(parent_carry, stage_peak)
+            # A finished stage is listed with its children under its parent (or at the top level);
+            # tracemalloc peaks of concurrent stages still overlap
+            with self._lock:
+                parent_records = open_stages[-1] if open_stages else self.records
+                parent_records.append(self._make_record(name, seconds, len(open_stages) + 1, peak_bytes))
+                parent_records.extend(children)
+
+
+# A profile whose run has ended (its thread is gone, or this thread has moved on to a new run)
+# was cut short; it is closed first so memory tracing does not stay on
+def start_profile(mode):
+    current_thread = threading.current_thread()
+    with _unfinished_lock:
+        stale = [
+            profile for profile in _unfinished_profiles
+            if profile._thread is current_thread or not profile._thread.is_alive()
+        ]
+    for profile in stale:
+        profile.finish(interrupted=True)
+    if mode is None:
+        return None
+    return Profile(trace_memory=mode == "memory").start()
+
+
+# No-op unless a profile is active in this thread, so library code can mark stages freely
+@contextmanager
+def stage(name):
+    profile = _active_profile.get()
+    if profile is None:
+        yield
+        return
+    with profile.stage(name):
+        yield
+
+
+def lap(name):
+    profile = _active_profile.get()
+    if profile is not None:
+        profile.lap(name)
+
+
+def timed_export(export_format, build):
+    started = time.perf_counter()
+    data = build()
+    record = {
+        "event": "export",
+        "format": export_format,
+        "seconds": time.perf_counter() - started,
+        "bytes": len(data),
+        "at": time.strftime("%H:%M:%S"),
+    }
+    recent_exports.appendleft(record)
+    if json_logging_enabled():
+        emit_json(record)
+    return data
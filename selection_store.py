@@ -0,0 +1,72 @@
+import os
+import json
+import time
+import sqlite3
+from contextlib import closing
+
+
+# Manual duplicate picks are stored per workbook hash as group key -> row fingerprint, so a
+# resumed session gets them back in one query and a submitted review is saved in one
+# transaction. An empty GRADES_SELECTIONS_DB disables the store.
+SELECTIONS_DB = os.environ.get("GRADES_SELECTIONS_DB", os.path.join(".cache", "selections.sqlite3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS selections (
+    workbook TEXT NOT NULL,
+    group_key TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (workbook, group_key)
+)
+"""
+
+
+def connect(db_path):
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=5)
+    conn.execute(SCHEMA)
+    return conn
+
+
+# Group keys are an email, or (email, assignment) for split exports
+def group_key_text(group_key):
+    return json.dumps(list(group_key) if isinstance(group_key, tuple) else group_key, ensure_ascii=False)
+
+
+def parse_group_key(text):
+    value = json.loads(text)
+    return tuple(value) if isinstance(value, list) else value
+
+
+def load_selections(workbook_hash, db_path=None):
+    db_path = SELECTIONS_DB if db_path is None else db_path
+    if not db_path:
+        return {}
+    try:
+        with closing(connect(db_path)) as conn:
+            rows = conn.execute(
+                "SELECT group_key, fingerprint FROM selections WHERE workbook = ?", (workbook_hash,)
+            ).fetchall()
+    except (sqlite3.Error, OSError):
+        # A locked or unreadable store only costs the remembered picks
+        return {}
+    return {parse_group_key(group_key): int(fingerprint) for group_key, fingerprint in rows}
+
+
+def save_selections(workbook_hash, selections, db_path=None):
+    db_path = SELECTIONS_DB if db_path is None else db_path
+    if not db_path or not selections:
+        return False
+    updated = time.time()
+    try:
+        with closing(connect(db_path)) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO selections (workbook, group_key, fingerprint, updated) VALUES (?, ?, ?, ?)",
+                [(workbook_hash, group_key_text(group_key), str(int(fingerprint)), updated)
+                 for group_key, fingerprint in selections.items()],
+            )
+    except (sqlite3.Error, OSError):
+        return False
+    return True
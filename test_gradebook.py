@@ -0,0 +1,59 @@
+from io import BytesIO
+
+import openpyxl
+import pandas as pd
+
+from gradebook import compact_frame, relabel_upload, format_percent_series, read_gradebook
+
+
+ROLES = {"email": "Email", "assignment": "Assignments", "points": "Points"}
+
+
+def gradebook_frame(rows):
+    return compact_frame(pd.DataFrame(rows, columns=["Email", "Assignments", "Points"]), ROLES)
+
+
+def test_relabel_upload_counts_retakes_once():
+    previous_df = gradebook_frame([("a", "Test", 1), ("b", "Test", 2)])
+    df = gradebook_frame([("a", "Test", 5), ("a", "Test", 6), ("b", "Test", 2)])
+
+    _, changes = relabel_upload(previous_df, df, ["Email", "Assignments"])
+
+    assert changes == {"added": 1, "changed": 1, "removed": 0}
+
+
+def test_relabel_upload_ignores_score_dtype_changes():
+    previous_df = gradebook_frame([("a", "Test", 5), ("b", "Test", 6)])
+    for late_points in (7.5, "abs"):
+        df = gradebook_frame([("a", "Test", 5), ("b", "Test", 6), ("c", "Test", late_points)])
+
+        relabeled, changes = relabel_upload(previous_df, df, ["Email", "Assignments"])
+
+        assert changes == {"added": 1, "changed": 0, "removed": 0}
+        assert relabeled.index.tolist() == [0, 1, 2]
+
+
+def test_format_percent_series_keeps_one_decimal_for_compact_integers():
+    series = pd.Series([0, 1, None], dtype="Int8")
+
+    assert format_percent_series(series, "").tolist() == ["0.0%", "100.0%", ""]
+
+
+def test_read_gradebook_skips_empty_rows_without_subject_filter():
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws["D1"] = "10A"
+    ws.append(["Full Name", "Email", "Assignments", "Points", "Max Points", "Percent"])
+    ws.append(["Ali", "a@x", "Test", 5, 10, 0.5])
+    ws.append([None] * 6)
+    ws.append(["Aysel", "b@x", "Quiz", 8, 10, 0.8])
+    ws["A6"].number_format = "0.00"
+    source = BytesIO()
+    wb.save(source)
+    source.seek(0)
+
+    _, _, df, total_rows, kept_rows, _, _ = read_gradebook(source, subject_filter=None)
+
+    assert total_rows == 4
+    assert kept_rows == 2
+    assert df["Full Name"].tolist() == ["Ali", "Aysel"]